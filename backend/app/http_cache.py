@@ -0,0 +1,95 @@
+"""
+Requisições condicionais (ETag / Last-Modified) guiadas pela versão das tabelas.
+
+Uso em uma rota:
+
+    not_modified = conditional_response(request, response, db, ["alerts"])
+    if not_modified:
+        return not_modified
+
+A verificação custa uma consulta por chave primária em ``table_versions``;
+a consulta principal e a serialização só acontecem quando os dados mudaram.
+Enquanto o incremento de versão de uma tabela estiver pendente neste
+processo, as respostas saem sem validadores e nunca como 304.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from .models.versioning import get_versions, pending_tables
+
+CACHE_CONTROL = "no-cache"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Comparação fraca (RFC 9110): ignora o prefixo W/
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    db: Session,
+    tables: Iterable[str],
+    variant: str = "",
+) -> Optional[Response]:
+    """Definir ETag/Last-Modified e devolver 304 se o cliente já tem a versão atual
+
+    ``variant`` distingue respostas que dependem de algo além dos dados
+    (ex.: a janela de tempo de uma série).
+    """
+    tables = list(tables)
+    if pending_tables(tables):
+        # A versão no banco não reflete a última alteração: sem ETag, o
+        # cliente não guarda um validador que casaria com dados antigos
+        response.headers["Cache-Control"] = CACHE_CONTROL
+        return None
+
+    versions = get_versions(db, tables)
+    # O instante entra na semente para que um banco recriado não repita ETags antigos
+    seed = "|".join(f"{name}:{version}:{ts}" for name, (version, ts) in sorted(versions.items()))
+    digest = hashlib.sha1(f"{seed}|{variant}".encode()).hexdigest()[:20]
+    etag = f'"{digest}"'
+
+    # Last-Modified só faz sentido quando a resposta depende apenas dos dados
+    modified = [ts for _, ts in versions.values() if ts is not None]
+    last_modified = None
+    if modified and not variant:
+        last_modified = max(
+            ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc) for ts in modified
+        ).astimezone(timezone.utc)
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    # If-None-Match tem precedência sobre If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since is not None and last_modified is not None:
+        not_modified = _not_modified_since(if_modified_since, last_modified)
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
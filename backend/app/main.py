@@ -1,26 +1,93 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import monitoring, predictions, alerts
-from .database import engine
-from .models import monitoring as monitoring_models
-import logging
+from fastapi.responses import JSONResponse, Response
+from .routers import monitoring, predictions, alerts, dashboard, admin
+from .database import engine, init_db, check_db
+from .services import get_ai_engine, rollups
+from . import metrics, profiling
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create tables with error handling
-try:
-    monitoring_models.Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Error creating database tables: {e}")
-    raise
+# Em produção o schema é aplicado uma vez pelo launcher (python run.py --migrate)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+# Carregar módulos pesados (numpy) em segundo plano após o startup
+WARM_HEAVY_MODULES = os.getenv("WARM_HEAVY_MODULES", "true").lower() == "true"
+
+# Instrumentação de consultas SQL
+metrics.instrument_engine(engine)
+
+
+async def ensure_schema(app: FastAPI) -> bool:
+    """Aplicar o schema se ainda não foi aplicado neste processo"""
+    if app.state.schema_ready:
+        return True
+    try:
+        await run_in_threadpool(init_db)
+        app.state.schema_ready = True
+        logger.info("Database tables created successfully")
+    except Exception as e:
+        logger.error(f"Error creating database tables: {e}")
+    return app.state.schema_ready
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Sem AUTO_MIGRATE assume-se que o schema já foi aplicado externamente
+    app.state.schema_ready = not AUTO_MIGRATE
+    # Um banco indisponível não derruba o worker: /health/ready reporta e tenta de novo
+    await ensure_schema(app)
+
+    app.state.warmup_task = None
+    if WARM_HEAVY_MODULES:
+        app.state.warmup_task = asyncio.create_task(run_in_threadpool(get_ai_engine))
+
+    # Compactação periódica de leituras antigas (COMPACTION_ENABLED)
+    compaction_task = None
+    if rollups.config.enabled:
+        compaction_task = asyncio.create_task(rollups.compaction_loop(
+            rollups.config.interval_seconds,
+            rollups.config.retention_days,
+            rollups.config.prune,
+        ))
+
+    # Snapshots das métricas para agregação entre workers (PROMETHEUS_MULTIPROC_DIR)
+    metrics.start_flusher()
+
+    app.state.startup_seconds = time.perf_counter() - started
+    metrics.APP_STARTUP_SECONDS.set(app.state.startup_seconds, phase="lifespan")
+    logger.info(
+        f"Cold start: import {IMPORT_SECONDS:.3f}s, startup {app.state.startup_seconds:.3f}s"
+    )
+    yield
+    if compaction_task is not None:
+        compaction_task.cancel()
+    if app.state.warmup_task is not None:
+        # A thread não pode ser interrompida: espera-se o fim do aquecimento
+        try:
+            await app.state.warmup_task
+        except Exception as e:
+            logger.error(f"Error warming up AI engine: {e}")
+    metrics.stop_flusher()
+    engine.dispose()
+
 
 app = FastAPI(
     title="EcoMonitor API",
     description="Sistema Preditivo de Riscos Ambientais",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS with security improvements
@@ -35,10 +102,18 @@ app.add_middleware(
     allow_headers=["Content-Type", "Authorization"],
 )
 
+# Latência por rota, tamanho das respostas e custo de SQL por requisição
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Profiler amostral opcional (PROFILING_ENABLED)
+app.add_middleware(profiling.ProfilingMiddleware)
+
 # Include routers
 app.include_router(monitoring.router, prefix="/api/v1")
 app.include_router(predictions.router, prefix="/api/v1")
 app.include_router(alerts.router, prefix="/api/v1")
+app.include_router(dashboard.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
@@ -50,8 +125,44 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    """Liveness: o processo está de pé (não consulta o banco)"""
     try:
         return {"status": "healthy", "version": "2.0.0"}
     except Exception as e:
         logger.error(f"Error in health check: {e}")
-        raise HTTPException(status_code=500, detail="Health check failed")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Health check failed")
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: banco acessível e schema aplicado"""
+    checks = {"database": False, "schema": False}
+    try:
+        await run_in_threadpool(check_db)
+        checks["database"] = True
+        checks["schema"] = await ensure_schema(app)
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {e}")
+
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "cold_start": {
+                "import_seconds": round(IMPORT_SECONDS, 3),
+                "startup_seconds": round(getattr(app.state, "startup_seconds", 0.0), 3),
+            },
+        },
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Métricas no formato texto do Prometheus"""
+    # Em modo multiprocesso a coleta lê e soma arquivos: fora do event loop
+    content = await run_in_threadpool(metrics.render_latest)
+    return Response(content=content, media_type=metrics.CONTENT_TYPE)
+
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+metrics.APP_STARTUP_SECONDS.set(IMPORT_SECONDS, phase="import")
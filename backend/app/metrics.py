@@ -0,0 +1,545 @@
+"""
+Métricas da aplicação expostas no formato texto do Prometheus.
+
+Implementação enxuta (sem dependências externas): contadores e histogramas
+em memória, protegidos por lock, um middleware ASGI que mede latência por
+rota e instrumentação do SQLAlchemy para contar e cronometrar consultas.
+
+Com vários workers, defina ``PROMETHEUS_MULTIPROC_DIR``: cada processo grava
+periodicamente um snapshot das suas métricas nesse diretório e ``/metrics``
+soma os snapshots de todos os workers (inclusive dos que já terminaram, para
+que os contadores nunca diminuam). Gauges recebem o rótulo ``pid`` e são
+descartados quando o worker termina (``mark_process_dead``). O diretório
+deve ser esvaziado a cada início do servidor (``reset_multiprocess_dir``).
+"""
+
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Diretório compartilhado entre workers (vazio = métricas apenas do processo)
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 1))
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _snapshot(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def _merge(current: Any, value: Any) -> Any:
+        return value if current is None else current + value
+
+    def _samples(self, values: Dict[Tuple[str, ...], Any], labelnames: Sequence[str]) -> List[str]:
+        return [f"{self.name}{_format_labels(labelnames, k)} {v}" for k, v in values.items()]
+
+    def render(
+        self,
+        values: Optional[Dict[Tuple[str, ...], Any]] = None,
+        labelnames: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples(
+            self._snapshot() if values is None else values,
+            self.labelnames if labelnames is None else labelnames,
+        ))
+        return lines
+
+
+class Counter(_Metric):
+    """Contador monotônico"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Valor atual neste processo"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """Valor que pode subir ou descer"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Histograma com buckets cumulativos"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # chave -> [contagens por bucket (+Inf no final), soma]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _snapshot(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            return {k: [list(counts), total] for k, (counts, total) in self._values.items()}
+
+    @staticmethod
+    def _merge(current: Any, value: Any) -> Any:
+        if current is None:
+            return [list(value[0]), value[1]]
+        return [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1]]
+
+    def _samples(self, values: Dict[Tuple[str, ...], Any], labelnames: Sequence[str]) -> List[str]:
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _format_labels(labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# Identificador do processo nos arquivos de snapshot. Inclui um sufixo
+# aleatório para que um pid reutilizado não sobrescreva um worker antigo.
+_process_token: Optional[Tuple[int, str]] = None
+
+
+def _snapshot_paths(directory: str) -> Dict[str, str]:
+    global _process_token
+    pid = os.getpid()
+    if _process_token is None or _process_token[0] != pid:
+        _process_token = (pid, uuid.uuid4().hex[:8])
+    suffix = f"{pid}_{_process_token[1]}.json"
+    return {kind: os.path.join(directory, f"{kind}_{suffix}") for kind in ("counter", "gauge")}
+
+
+def write_snapshot() -> None:
+    """Gravar as métricas deste processo em PROMETHEUS_MULTIPROC_DIR"""
+    if not MULTIPROC_DIR:
+        return
+    payloads: Dict[str, Dict[str, list]] = {"counter": {}, "gauge": {}}
+    for metric in _registry:
+        kind = "gauge" if metric.kind == "gauge" else "counter"
+        payloads[kind][metric.name] = [[list(k), v] for k, v in metric._snapshot().items()]
+    for kind, path in _snapshot_paths(MULTIPROC_DIR).items():
+        _write_json(path, payloads[kind])
+
+
+ARCHIVE_FILE = "counter_archive.json"
+
+
+def _merge_value(current: Any, value: Any) -> Any:
+    # Histogramas são [contagens por bucket, soma]; os demais, números
+    if isinstance(value, list):
+        return Histogram._merge(current, value)
+    return _Metric._merge(current, value)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    # Substituição atômica: quem lê nunca vê um arquivo pela metade
+    os.replace(tmp_path, path)
+
+
+def mark_process_dead(pid: int, directory: Optional[str] = None) -> None:
+    """Descartar os gauges de um worker encerrado e arquivar seus contadores
+
+    Os contadores são somados em um único arquivo (ARCHIVE_FILE), de modo
+    que o diretório mantenha cerca de um arquivo por worker vivo mesmo com
+    a reciclagem por ``max_requests``. Chamar apenas no master (child_exit).
+    """
+    directory = directory or MULTIPROC_DIR
+    if not directory:
+        return
+    for path in glob.glob(os.path.join(directory, f"gauge_{pid}_*.json")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    counter_paths = glob.glob(os.path.join(directory, f"counter_{pid}_*.json"))
+    if not counter_paths:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    archive = _read_json(archive_path) or {"merged": [], "metrics": {}}
+    merged = {
+        name: {tuple(key): value for key, value in items}
+        for name, items in archive["metrics"].items()
+    }
+    names = [os.path.basename(path) for path in counter_paths]
+    for path in counter_paths:
+        for name, items in (_read_json(path) or {}).items():
+            values = merged.setdefault(name, {})
+            for key, value in items:
+                key = tuple(key)
+                values[key] = _merge_value(values.get(key), value)
+
+    # O arquivo é gravado antes da remoção e lista os snapshots já somados:
+    # uma leitura concorrente que ainda os encontre os ignora. Nomes cujo
+    # arquivo já foi removido (em chamadas anteriores) deixam a lista.
+    still_present = [
+        name for name in archive["merged"] if os.path.exists(os.path.join(directory, name))
+    ]
+    _write_json(archive_path, {
+        "merged": still_present + names,
+        "metrics": {
+            name: [[list(key), value] for key, value in values.items()]
+            for name, values in merged.items()
+        },
+    })
+    for path in counter_paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def reset_multiprocess_dir(directory: str) -> None:
+    """Criar o diretório de snapshots e remover os de execuções anteriores"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.json*")):
+        os.remove(path)
+
+
+_flusher_stop = threading.Event()
+_flusher: Optional[threading.Thread] = None
+
+
+def _flush_loop() -> None:
+    while not _flusher_stop.wait(FLUSH_SECONDS):
+        write_snapshot()
+
+
+def start_flusher() -> None:
+    """Gravar snapshots periodicamente (chamar no worker, depois do fork)"""
+    global _flusher
+    if not MULTIPROC_DIR or (_flusher is not None and _flusher.is_alive()):
+        return
+    _flusher_stop.clear()
+    _flusher = threading.Thread(target=_flush_loop, name="metrics-flusher", daemon=True)
+    _flusher.start()
+
+
+def stop_flusher() -> None:
+    """Parar a gravação periódica e gravar o snapshot final"""
+    _flusher_stop.set()
+    write_snapshot()
+
+
+def _collect_multiprocess() -> Dict[str, Dict[Tuple[str, ...], Any]]:
+    # O snapshot deste processo é regravado para que a resposta o inclua atualizado
+    write_snapshot()
+    by_name = {metric.name: metric for metric in _registry}
+    merged: Dict[str, Dict[Tuple[str, ...], Any]] = {name: {} for name in by_name}
+    payloads = []
+    for path in sorted(glob.glob(os.path.join(MULTIPROC_DIR, "*.json"))):
+        basename = os.path.basename(path)
+        if basename == ARCHIVE_FILE:
+            continue
+        # None: removido (worker encerrado) entre o glob e a leitura
+        payload = _read_json(path)
+        if payload is not None:
+            payloads.append((basename, payload))
+    # Lido por último: se um snapshot sumiu antes da leitura, ele já está aqui
+    archive = _read_json(os.path.join(MULTIPROC_DIR, ARCHIVE_FILE))
+    archived = set(archive["merged"]) if archive else set()
+    if archive:
+        payloads.append((ARCHIVE_FILE, archive["metrics"]))
+
+    for basename, payload in payloads:
+        if basename in archived:
+            continue
+        kind, pid = basename.split("_", 2)[:2]
+        for name, items in payload.items():
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            values = merged[name]
+            for key, value in items:
+                key = tuple(key) + ((pid,) if kind == "gauge" else ())
+                values[key] = metric._merge(values.get(key), value)
+    return merged
+
+
+def render_latest() -> str:
+    """Serializar todas as métricas registradas (de todos os workers, se configurado)"""
+    lines: List[str] = []
+    if MULTIPROC_DIR:
+        merged = _collect_multiprocess()
+        for metric in _registry:
+            labelnames = metric.labelnames + (("pid",) if metric.kind == "gauge" else ())
+            lines.extend(metric.render(merged[metric.name], labelnames))
+    else:
+        for metric in _registry:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Métricas de inicialização
+APP_STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "Duração das fases de inicialização do processo",
+    ("phase",),
+)
+
+# Métricas HTTP
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Latência das requisições HTTP por rota e status",
+    ("method", "route", "status"),
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes",
+    "Tamanho do corpo das respostas HTTP",
+    ("method", "route"),
+    buckets=SIZE_BUCKETS,
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Tempo gasto em consultas SQL por requisição",
+    ("method", "route"),
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Número de consultas SQL por requisição",
+    ("method", "route"),
+    buckets=COUNT_BUCKETS,
+)
+
+# Métricas de banco de dados
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Duração das consultas SQL",
+    ("operation",),
+)
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors_total",
+    "Consultas SQL que falharam",
+    ("operation",),
+)
+
+# Métricas do motor de IA
+AI_ENGINE_SECONDS = Histogram(
+    "ai_engine_duration_seconds",
+    "Tempo gasto dentro do AIEngine",
+    ("operation",),
+)
+AI_ENGINE_POINTS = Counter(
+    "ai_engine_points_scored_total",
+    "Pontos avaliados pelo AIEngine",
+    ("operation",),
+)
+AI_ENGINE_DEGRADED = Counter(
+    "ai_engine_degraded_total",
+    "Cálculos de risco respondidos em modo degradado por falta de tempo",
+    ("strategy",),
+)
+
+# Compactação de leituras antigas
+COMPACTION_RUNS = Counter(
+    "compaction_runs_total",
+    "Execuções da compactação de leituras por resultado",
+    ("status",),
+)
+COMPACTION_ROWS = Counter(
+    "compaction_rows_total",
+    "Linhas agregadas (rollup_hour/rollup_day) e leituras removidas (pruned)",
+    ("kind",),
+)
+
+# Coalescência de requisições (single-flight)
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Chamadas por papel: leader executa, coalesced reaproveita a execução em andamento",
+    ("flight", "role"),
+)
+
+
+class RequestStats:
+    """Acumulador por requisição (tempo e quantidade de SQL)"""
+
+    __slots__ = ("db_queries", "db_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    # Usar o template da rota evita explosão de cardinalidade (ids na URL)
+    return path if path else "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que registra latência, tamanho e custo de SQL por rota"""
+
+    def __init__(self, app, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        response_bytes = 0
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            method = scope.get("method", "")
+            route = _route_label(scope)
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=method, route=route, status=str(status_code))
+            HTTP_RESPONSE_BYTES.observe(response_bytes, method=method, route=route)
+            HTTP_REQUEST_DB_SECONDS.observe(stats.db_seconds, method=method, route=route)
+            HTTP_REQUEST_DB_QUERIES.observe(stats.db_queries, method=method, route=route)
+
+
+def _operation(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Registrar eventos do SQLAlchemy para medir consultas"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        DB_QUERY_SECONDS.observe(elapsed, operation=_operation(statement))
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+        statement = exception_context.statement or ""
+        DB_QUERY_ERRORS.inc(operation=_operation(statement))
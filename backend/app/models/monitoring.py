@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, Index
 from sqlalchemy.sql import func
 from ..database import Base
 import enum
@@ -30,7 +30,7 @@ class MonitoringPoint(Base):
     latitude = Column(Float)
     longitude = Column(Float)
     estado = Column(String)
-    data_medicao = Column(DateTime(timezone=True), server_default=func.now())
+    data_medicao = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Alert(Base):
@@ -44,4 +44,34 @@ class Alert(Base):
     probabilidade = Column(Float)
     status = Column(String, default="ativo")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class MonitoringRollup(Base):
+    """Agregado horário/diário de leituras antigas por região e estado"""
+    __tablename__ = "monitoring_rollups"
+    __table_args__ = (
+        Index("ix_monitoring_rollups_granularidade_periodo", "granularidade", "periodo"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularidade = Column(String, nullable=False)  # "hour" ou "day"
+    periodo = Column(DateTime(timezone=True), nullable=False)
+    regiao = Column(Enum(Region))
+    estado = Column(String)
+    total = Column(Integer, nullable=False)
+    temperatura_media = Column(Float)
+    temperatura_min = Column(Float)
+    temperatura_max = Column(Float)
+    umidade_media = Column(Float)
+    umidade_min = Column(Float)
+    umidade_max = Column(Float)
+    nivel_fumaca_media = Column(Float)
+    nivel_fumaca_min = Column(Float)
+    nivel_fumaca_max = Column(Float)
+    velocidade_vento_media = Column(Float)
+    velocidade_vento_min = Column(Float)
+    velocidade_vento_max = Column(Float)
+    risco_baixo = Column(Integer, nullable=False, default=0)
+    risco_medio = Column(Integer, nullable=False, default=0)
+    risco_alto = Column(Integer, nullable=False, default=0)
+    risco_critico = Column(Integer, nullable=False, default=0)
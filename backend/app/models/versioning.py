@@ -0,0 +1,167 @@
+"""
+Contador de alterações por tabela.
+
+A sessão anota as tabelas monitoradas alteradas em cada flush (ou
+update/delete em massa) e, depois do commit, incrementa a versão delas em
+uma transação curta e separada. Assim o lock da linha de versão não fica
+preso até o fim da transação de quem escreve, e inserções concorrentes não
+são serializadas nela. Ler a versão é uma consulta por chave primária,
+barata o bastante para validar ETags a cada requisição.
+
+O incremento só acontece quando a sessão já devolveu sua conexão ao pool
+(fim da transação raiz), para não precisar de duas conexões ao mesmo
+tempo. Se ele falhar, a tabela fica pendente neste processo (ver
+``pending_tables``) até um incremento posterior dar certo.
+"""
+
+import itertools
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, String, event, insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from ..database import Base
+
+logger = logging.getLogger(__name__)
+
+TRACKED_TABLES = {"monitoring_points", "alerts"}
+
+class TableVersion(Base):
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+def bump_version(connection, table_name: str) -> None:
+    """Incrementar a versão de uma tabela na transação da conexão dada
+
+    Use uma transação curta, depois do commit dos dados: o UPDATE trava a
+    linha da tabela até o fim da transação.
+    """
+    table = TableVersion.__table__
+    result = connection.execute(
+        update(table)
+        .where(table.c.table_name == table_name)
+        .values(version=table.c.version + 1, updated_at=func.now())
+    )
+    if result.rowcount == 0:
+        connection.execute(
+            insert(table).values(table_name=table_name, version=1, updated_at=func.now())
+        )
+
+# Tabelas com incremento pendente -> número da última falha. O número evita
+# que um incremento em andamento limpe uma falha registrada depois dele.
+_pending: Dict[str, int] = {}
+_pending_lock = threading.Lock()
+_failures = itertools.count(1)
+
+def bump_versions(bind, table_names: Iterable[str]) -> bool:
+    """Incrementar as versões das tabelas (e das pendentes) em uma transação curta
+
+    ``bind`` é um Engine: usa uma conexão própria do pool. Em caso de falha
+    as tabelas ficam pendentes e entram no próximo incremento.
+    """
+    with _pending_lock:
+        seen = dict(_pending)
+    names = sorted(set(table_names) | set(seen))
+    try:
+        with bind.begin() as connection:
+            for table_name in names:
+                bump_version(connection, table_name)
+    except Exception as e:
+        with _pending_lock:
+            failure = next(_failures)
+            _pending.update({table_name: failure for table_name in names})
+        logger.error(f"Erro ao atualizar versões de {names}: {e}")
+        return False
+    with _pending_lock:
+        for table_name, failure in seen.items():
+            if _pending.get(table_name) == failure:
+                del _pending[table_name]
+    return True
+
+def pending_tables(table_names: Iterable[str]) -> Set[str]:
+    """Tabelas alteradas cuja versão ainda não foi incrementada neste processo
+
+    Enquanto houver pendência a versão no banco está desatualizada: não
+    responda 304 com base nela.
+    """
+    with _pending_lock:
+        return set(table_names) & _pending.keys()
+
+def seed_versions(connection) -> None:
+    """Criar as linhas de versão ausentes (evita corrida no primeiro insert)"""
+    table = TableVersion.__table__
+    existing = set(connection.execute(select(table.c.table_name)).scalars())
+    for table_name in sorted(TRACKED_TABLES - existing):
+        connection.execute(insert(table).values(table_name=table_name, version=0))
+
+def get_versions(
+    session: Session, table_names: Iterable[str]
+) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    """Versão e instante da última alteração de cada tabela (0/None se nunca alterada)"""
+    names = list(table_names)
+    rows = session.execute(
+        select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(names))
+    ).all()
+    found = {name: (version, updated_at) for name, version, updated_at in rows}
+    return {name: found.get(name, (0, None)) for name in names}
+
+def _table_name(obj) -> Optional[str]:
+    table = getattr(obj, "__table__", None)
+    return table.name if table is not None else None
+
+def _changed_tables(session) -> set:
+    return session.info.setdefault("changed_tables", set())
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    changed = {
+        _table_name(obj)
+        for obj in itertools.chain(session.new, session.deleted)
+    }
+    changed.update(
+        _table_name(obj)
+        for obj in session.dirty
+        if session.is_modified(obj, include_collections=False)
+    )
+    _changed_tables(session).update(changed & TRACKED_TABLES)
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    # query(...).update()/delete() não passam pelo flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.local_table.name in TRACKED_TABLES:
+        _changed_tables(orm_execute_state.session).add(mapper.local_table.name)
+
+@event.listens_for(Session, "after_commit")
+def _mark_committed(session):
+    changed = session.info.pop("changed_tables", None)
+    if changed:
+        session.info.setdefault("committed_tables", set()).update(changed)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changed_tables", None)
+
+@event.listens_for(Session, "after_transaction_end")
+def _bump_after_release(session, transaction):
+    # Só a transação raiz: neste ponto a conexão da sessão já voltou ao pool
+    if transaction.parent is not None:
+        return
+    # Alterações de uma transação encerrada sem commit nem rollback (close)
+    session.info.pop("changed_tables", None)
+    committed = session.info.pop("committed_tables", None)
+    if not committed:
+        return
+    # Os dados já estão visíveis: na pior hipótese um leitor recebe o ETag
+    # antigo com dados novos e revalida na próxima requisição
+    bump_versions(session.get_bind(), committed)
@@ -0,0 +1,381 @@
+"""
+Profiler estatístico opcional para requisições lentas.
+
+Uma thread em segundo plano amostra periodicamente a pilha de cada
+requisição "armada". O custo fica nessa thread (nada é instrumentado no
+código da requisição), o que permite deixar o recurso ligado em produção
+com taxas de amostragem baixas. Com ``PROFILING_THRESHOLD_MS`` > 0 toda
+requisição elegível é armada (a taxa de amostragem não limita o custo);
+``PROFILING_MAX_ARMED`` limita quantas são amostradas ao mesmo tempo.
+
+O event loop é compartilhado por todas as requisições do worker, então a
+pilha da thread só é atribuída à requisição quando a task dela é a que está
+executando. Nos demais instantes a amostra é a cadeia de corrotinas da task
+suspensa, terminando no objeto aguardado (ex.: um Future de
+run_in_threadpool). O trabalho enviado ao pool por ``profiling.run_in_threadpool``
+é amostrado na thread que o executa e aparece sob essa espera (a chave da
+requisição armada segue em uma ContextVar, copiada para a thread).
+Cada perfil registra quantas requisições estavam em andamento no processo
+e quantas amostras foram de espera. Perfis que ultrapassam
+o limiar de latência, ou que foram sorteados, são guardados em um buffer
+circular e exportados no formato de pilhas colapsadas (flamegraph.pl,
+speedscope, inferno).
+"""
+
+import asyncio
+import functools
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+
+from . import metrics
+
+MAX_STACK_DEPTH = 128
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class ProfilingConfig:
+    """Configuração lida das variáveis de ambiente"""
+
+    def __init__(self):
+        self.enabled = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+        # Fração das requisições elegíveis guardada independentemente da latência
+        self.sample_rate = min(1.0, max(0.0, _env_float("PROFILING_SAMPLE_RATE", 0.0)))
+        # Requisições acima deste limiar (ms) são guardadas; 0 desativa o critério
+        self.threshold_ms = max(0.0, _env_float("PROFILING_THRESHOLD_MS", 1000))
+        self.interval_ms = max(1.0, _env_float("PROFILING_INTERVAL_MS", 10))
+        self.buffer_size = max(1, int(_env_float("PROFILING_BUFFER_SIZE", 50)))
+        self.path_prefix = os.getenv("PROFILING_PATH_PREFIX", "/api/v1/predictions")
+        # Máximo de requisições armadas ao mesmo tempo (custo de cada amostragem)
+        self.max_armed = max(1, int(_env_float("PROFILING_MAX_ARMED", 8)))
+
+
+@dataclass
+class RequestProfile:
+    id: int
+    method: str
+    path: str
+    status: int
+    duration_ms: float
+    captured_at: datetime
+    reason: str
+    samples: Dict[str, int] = field(default_factory=dict, repr=False)
+    # Maior número de requisições simultâneas no processo durante a captura
+    max_concurrent: int = 1
+    # Amostras em que a task estava suspensa (aguardando I/O, thread ou outra task)
+    suspended_samples: int = 0
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": round(self.duration_ms, 2),
+            "captured_at": self.captured_at.isoformat(),
+            "reason": self.reason,
+            "samples": self.sample_count,
+            "suspended_samples": self.suspended_samples,
+            "max_concurrent_requests": self.max_concurrent,
+        }
+
+    def collapsed(self) -> str:
+        """Pilhas no formato colapsado: 'raiz;...;folha contagem'"""
+        lines = [f"{stack} {count}" for stack, count in sorted(self.samples.items())]
+        return "\n".join(lines) + "\n"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename.rsplit(os.sep, 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _collapse_task(task: asyncio.Task) -> str:
+    """Cadeia de corrotinas de uma task suspensa, da raiz ao objeto aguardado"""
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = (
+            getattr(awaitable, "cr_frame", None)
+            or getattr(awaitable, "gi_frame", None)
+            or getattr(awaitable, "ag_frame", None)
+        )
+        if frame is None:
+            labels.append(f"<aguardando {type(awaitable).__name__}>")
+            break
+        labels.append(_frame_label(frame))
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    return ";".join(labels)
+
+
+@dataclass
+class _Armed:
+    thread_id: int
+    loop: Optional[asyncio.AbstractEventLoop]
+    task: Optional[asyncio.Task]
+    samples: Counter = field(default_factory=Counter)
+    suspended: int = 0
+    # Threads do pool executando trabalho desta requisição
+    workers: Set[int] = field(default_factory=set)
+    max_concurrent: int = 1
+
+
+class StackSampler:
+    """Amostra as pilhas das requisições armadas"""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        # Requisições em andamento no processo (atualizado pelo middleware)
+        self.inflight = 0
+        self._active: Dict[int, _Armed] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self) -> None:
+        # Iniciada sob demanda para não existir antes do fork dos workers
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def start(
+        self,
+        key: int,
+        thread_id: int,
+        task: Optional[asyncio.Task] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        """Armar a amostragem; com ``task`` só a pilha dessa task é atribuída"""
+        with self._lock:
+            self._active[key] = _Armed(thread_id, loop, task, max_concurrent=max(1, self.inflight))
+            self._ensure_thread()
+            self._wakeup.set()
+
+    def stop(self, key: int) -> Optional[_Armed]:
+        with self._lock:
+            return self._active.pop(key, None)
+
+    def armed_count(self) -> int:
+        return len(self._active)
+
+    def attach(self, key: int, thread_id: int) -> None:
+        """Registrar uma thread do pool trabalhando para a requisição ``key``"""
+        with self._lock:
+            armed = self._active.get(key)
+            if armed is not None:
+                armed.workers.add(thread_id)
+
+    def detach(self, key: int, thread_id: int) -> None:
+        with self._lock:
+            armed = self._active.get(key)
+            if armed is not None:
+                armed.workers.discard(thread_id)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            self._wakeup.wait()
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._wakeup.clear()
+                    continue
+                collapsed_by_thread = {}
+                for armed in self._active.values():
+                    thread_id = armed.thread_id
+                    if thread_id == own_id or thread_id not in frames:
+                        continue
+                    armed.max_concurrent = max(armed.max_concurrent, self.inflight)
+                    # A task corrente pode mudar entre o snapshot e esta leitura;
+                    # o erro fica limitado a uma amostra
+                    if armed.task is not None and asyncio.current_task(armed.loop) is not armed.task:
+                        stack = _collapse_task(armed.task)
+                        if not stack:
+                            continue
+                        armed.suspended += 1
+                        # Trabalho no pool aparece sob o ponto em que a task espera
+                        busy = [t for t in armed.workers if t in frames]
+                        for worker_id in busy:
+                            if worker_id not in collapsed_by_thread:
+                                collapsed_by_thread[worker_id] = _collapse(frames[worker_id])
+                            armed.samples[f"{stack};{collapsed_by_thread[worker_id]}"] += 1
+                        if not busy:
+                            armed.samples[stack] += 1
+                        continue
+                    if thread_id not in collapsed_by_thread:
+                        collapsed_by_thread[thread_id] = _collapse(frames[thread_id])
+                    armed.samples[collapsed_by_thread[thread_id]] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Buffer circular com os perfis mais recentes"""
+
+    def __init__(self, maxlen: int):
+        self._profiles: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+config = ProfilingConfig()
+sampler = StackSampler(config.interval_ms)
+store = ProfileStore(config.buffer_size)
+
+# Chave da requisição armada no contexto atual (None fora de uma captura)
+_armed_key: ContextVar[Optional[int]] = ContextVar("profiling_armed_key", default=None)
+
+T = TypeVar("T")
+
+
+def _attached(key: int, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    thread_id = threading.get_ident()
+    sampler.attach(key, thread_id)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sampler.detach(key, thread_id)
+
+
+async def run_in_threadpool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """``fastapi.concurrency.run_in_threadpool`` visível para o profiler
+
+    Se a requisição atual está sendo amostrada, a thread do pool que executa
+    ``func`` também é amostrada enquanto ela roda.
+    """
+    key = _armed_key.get()
+    if key is None:
+        return await _run_in_threadpool(func, *args, **kwargs)
+    return await _run_in_threadpool(functools.partial(_attached, key, func, *args, **kwargs))
+
+PROFILES_CAPTURED = metrics.Counter(
+    "profiler_profiles_captured_total",
+    "Perfis de requisição guardados no buffer",
+    ("reason",),
+)
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI que arma o sampler para as rotas configuradas"""
+
+    def __init__(self, app, profiling_config: ProfilingConfig = config):
+        self.app = app
+        self.config = profiling_config
+
+    async def __call__(self, scope, receive, send):
+        cfg = self.config
+        if not cfg.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampler.inflight += 1
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            sampler.inflight -= 1
+
+    async def _profile(self, scope, receive, send):
+        cfg = self.config
+        if not scope.get("path", "").startswith(cfg.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        sampled = cfg.sample_rate > 0 and random.random() < cfg.sample_rate
+        if (not sampled and cfg.threshold_ms <= 0) or sampler.armed_count() >= cfg.max_armed:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        key = store.next_id()
+        sampler.start(
+            key,
+            threading.get_ident(),
+            asyncio.current_task(),
+            asyncio.get_running_loop(),
+        )
+        token = _armed_key.set(key)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            _armed_key.reset(token)
+            armed = sampler.stop(key)
+            slow = cfg.threshold_ms > 0 and duration_ms >= cfg.threshold_ms
+            if (slow or sampled) and armed is not None and armed.samples:
+                reason = "slow" if slow else "sampled"
+                store.add(RequestProfile(
+                    id=key,
+                    method=scope.get("method", ""),
+                    path=scope.get("path", ""),
+                    status=status_code,
+                    duration_ms=duration_ms,
+                    captured_at=datetime.now(timezone.utc),
+                    reason=reason,
+                    samples=dict(armed.samples),
+                    max_concurrent=armed.max_concurrent,
+                    suspended_samples=armed.suspended,
+                ))
+                PROFILES_CAPTURED.inc(reason=reason)
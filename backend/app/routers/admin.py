@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import os
+import secrets
+from .. import profiling
+from ..services import rollups
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Exigir o token definido em ADMIN_TOKEN"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Endpoints administrativos desativados")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=403, detail="Token administrativo inválido")
+
+@router.get("/profiles", dependencies=[Depends(require_admin_token)])
+async def list_profiles():
+    """Listar perfis capturados (mais recentes primeiro)"""
+    cfg = profiling.config
+    return {
+        "habilitado": cfg.enabled,
+        "taxa_amostragem": cfg.sample_rate,
+        "limiar_ms": cfg.threshold_ms,
+        "perfis": [p.summary() for p in profiling.store.list()],
+    }
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_admin_token)],
+)
+async def download_profile(profile_id: int):
+    """Baixar perfil em pilhas colapsadas (compatível com flamegraph.pl/speedscope)"""
+    profile = profiling.store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+    )
+
+@router.delete("/profiles", dependencies=[Depends(require_admin_token)])
+async def clear_profiles():
+    """Esvaziar o buffer de perfis"""
+    profiling.store.clear()
+    return {"message": "Perfis removidos"}
+
+@router.post("/compaction", dependencies=[Depends(require_admin_token)])
+async def run_compaction(prune: Optional[bool] = None):
+    """Executar a compactação de leituras antigas imediatamente"""
+    cfg = rollups.config
+    try:
+        return await run_in_threadpool(
+            rollups.compact_readings,
+            cfg.retention_days,
+            cfg.prune if prune is None else prune,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na compactação: {str(e)}")
@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import List, Optional
 from ..database import get_db
+from ..http_cache import conditional_response
 from ..models.monitoring import Alert as AlertModel
 from ..schemas.monitoring import Alert, AlertCreate
+from ..services.statistics import alerts_summary
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
 @router.get("/", response_model=List[Alert])
 async def get_alerts(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
@@ -18,6 +21,10 @@ async def get_alerts(
 ):
     """Buscar alertas com filtros opcionais"""
     try:
+        not_modified = conditional_response(request, response, db, ["alerts"])
+        if not_modified:
+            return not_modified
+
         query = db.query(AlertModel)
         
         if status:
@@ -75,22 +82,16 @@ async def update_alert_status(
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar status: {str(e)}")
 
 @router.get("/stats/summary")
-async def get_alerts_summary(db: Session = Depends(get_db)):
+async def get_alerts_summary(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
     """Resumo estatístico dos alertas"""
     try:
-        total_alerts = db.query(AlertModel).count()
-        active_alerts = db.query(AlertModel).filter(AlertModel.status == "ativo").count()
-        
-        # Por nível de criticidade
-        criticality_stats = db.query(
-            AlertModel.nivel_criticidade,
-            func.count(AlertModel.id)
-        ).group_by(AlertModel.nivel_criticidade).all()
-        
-        return {
-            "total_alertas": total_alerts,
-            "alertas_ativos": active_alerts,
-            "por_criticidade": dict(criticality_stats)
-        }
+        not_modified = conditional_response(request, response, db, ["alerts"])
+        if not_modified:
+            return not_modified
+        return alerts_summary(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter resumo: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from ..database import get_db
+from ..http_cache import conditional_response
+from ..services.statistics import monitoring_summary, alerts_summary
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+@router.get("/summary")
+async def get_dashboard_summary(
+    request: Request,
+    response: Response,
+    bucket: str = Query("day", pattern="^(hour|day)$", description="Granularidade das séries"),
+    dias: int = Query(7, ge=1, le=365, description="Janela das séries em dias"),
+    db: Session = Depends(get_db)
+):
+    """Estatísticas de monitoramento e alertas do dashboard (uma consulta por tabela)"""
+    try:
+        # Janela alinhada ao início do período: a resposta (e o ETag) só muda
+        # quando os dados mudam ou um novo período começa
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        if bucket == "day":
+            now = now.replace(hour=0)
+        since = now - timedelta(days=dias)
+
+        not_modified = conditional_response(
+            request, response, db, ["monitoring_points", "alerts"], variant=since.isoformat()
+        )
+        if not_modified:
+            return not_modified
+
+        return {
+            "monitoramento": monitoring_summary(db, bucket=bucket, since=since),
+            "alertas": alerts_summary(db, bucket=bucket, since=since),
+            "bucket": bucket,
+            "desde": since,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter resumo do dashboard: {str(e)}")
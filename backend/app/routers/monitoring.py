@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
 from ..database import get_db
+from ..http_cache import conditional_response
 from ..models.monitoring import MonitoringPoint as MonitoringPointModel
 from ..schemas.monitoring import MonitoringPoint, MonitoringPointCreate
+from ..services.statistics import monitoring_summary
+from ..services.rollups import sensor_history
 
 router = APIRouter(prefix="/monitoring", tags=["monitoring"])
 
 @router.get("/points", response_model=List[MonitoringPoint])
 async def get_monitoring_points(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     regiao: str = None,
@@ -17,6 +22,10 @@ async def get_monitoring_points(
 ):
     """Buscar pontos de monitoramento"""
     try:
+        not_modified = conditional_response(request, response, db, ["monitoring_points"])
+        if not_modified:
+            return not_modified
+
         query = db.query(MonitoringPointModel)
         
         if regiao:
@@ -53,23 +62,49 @@ async def create_monitoring_point(
     return db_point
 
 @router.get("/stats")
-async def get_monitoring_stats(db: Session = Depends(get_db)):
+async def get_monitoring_stats(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
     """Estatísticas gerais de monitoramento"""
     try:
-        total_points = db.query(MonitoringPointModel).count()
-        
-        # Contagem por região
-        regions = db.query(MonitoringPointModel.regiao, 
-                          func.count(MonitoringPointModel.id)).group_by(MonitoringPointModel.regiao).all()
-        
-        # Contagem por nível de risco
-        risk_levels = db.query(MonitoringPointModel.nivel_risco,
-                              func.count(MonitoringPointModel.id)).group_by(MonitoringPointModel.nivel_risco).all()
-        
+        not_modified = conditional_response(request, response, db, ["monitoring_points"])
+        if not_modified:
+            return not_modified
+        return monitoring_summary(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas: {str(e)}")
+
+@router.get("/history")
+async def get_monitoring_history(
+    request: Request,
+    response: Response,
+    bucket: str = Query("day", pattern="^(hour|day)$", description="Granularidade da série"),
+    dias: int = Query(30, ge=1, le=3650, description="Janela da série em dias"),
+    regiao: Optional[str] = None,
+    estado: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Série histórica dos sensores (lê os agregados para períodos já compactados)"""
+    try:
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        if bucket == "day":
+            now = now.replace(hour=0)
+        since = now - timedelta(days=dias)
+        # Inclui o período corrente (ainda incompleto)
+        until = now + (timedelta(days=1) if bucket == "day" else timedelta(hours=1))
+
+        not_modified = conditional_response(
+            request, response, db, ["monitoring_points"], variant=since.isoformat()
+        )
+        if not_modified:
+            return not_modified
+
         return {
-            "total_pontos": total_points,
-            "por_regiao": dict(regions),
-            "por_nivel_risco": dict(risk_levels)
+            "bucket": bucket,
+            "desde": since,
+            "serie": sensor_history(db, bucket, since, until, regiao=regiao, estado=estado),
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro ao obter histórico: {str(e)}")
@@ -1,74 +1,161 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from ..database import get_db
+import os
+import time
+from ..database import get_db, SessionLocal
+from ..profiling import run_in_threadpool
 from ..models.monitoring import MonitoringPoint as MonitoringPointModel
-from ..schemas.monitoring import FireRiskResponse
-from ..services.ai_engine import AIEngine
+from ..schemas.monitoring import FireRiskResponse, FireRiskOverviewResponse
+from ..services import fire_risk, get_ai_engine
+from ..services.singleflight import SingleFlight
 
 router = APIRouter(prefix="/predictions", tags=["predictions"])
 
+# Orçamento de latência padrão (ms) para o cálculo de risco; 0 desativa
+DEFAULT_BUDGET_MS = float(os.getenv("FIRE_RISK_BUDGET_MS", 0))
+
+BUDGET_QUERY = Query(
+    None,
+    ge=0,
+    description="Orçamento de latência em ms (0 desativa; padrão: FIRE_RISK_BUDGET_MS)",
+)
+
+# Coalescência de /fire-risk e /fire-risk/{regiao} idênticos em andamento
+region_flight = SingleFlight("fire_risk_region")
+overview_flight = SingleFlight("fire_risk_overview")
+
+def compute_deadline(budget_ms: Optional[float], started: float) -> Optional[float]:
+    """Prazo absoluto (perf_counter) a partir do início da requisição"""
+    budget = DEFAULT_BUDGET_MS if budget_ms is None else budget_ms
+    return started + budget / 1000 if budget > 0 else None
+
 @router.post("/fire-risk", response_model=FireRiskResponse)
 async def calculate_fire_risk(
     regiao: Optional[str] = None,
     limit: int = 100,
+    budget_ms: Optional[float] = BUDGET_QUERY,
     db: Session = Depends(get_db)
 ):
     """Calcular risco de incêndio para região"""
+    started = time.perf_counter()
     try:
-        ai_engine = AIEngine()
-        
-        # Buscar pontos de monitoramento
-        query = db.query(MonitoringPointModel)
         if regiao:
             # Validar região
             valid_regions = ['amazonia', 'cerrado', 'caatinga', 'pantanal', 'mata_atlantica']
             if regiao not in valid_regions:
                 raise HTTPException(status_code=400, detail=f"Região inválida. Use: {valid_regions}")
-            query = query.filter(MonitoringPointModel.regiao == regiao)
         
-        points = query.limit(min(limit, 1000)).all()
+        # Estratégia (completo, amostra ou cache) decidida antes de carregar os pontos
+        result = await run_in_threadpool(
+            fire_risk.compute_fire_risk,
+            db,
+            regiao,
+            compute_deadline(budget_ms, started),
+            cache_key=f"{regiao or 'todas'}:{min(limit, 1000)}",
+            limit=min(limit, 1000),
+        )
         
-        if not points:
+        if result is None:
             raise HTTPException(
                 status_code=404, 
                 detail=f"Nenhum ponto encontrado para região: {regiao}"
             )
         
-        # Calcular risco usando AI Engine
-        result = await ai_engine.calculate_fire_risk(points)
-        
         return FireRiskResponse(**result)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao calcular risco: {str(e)}")
 
+def _load_fire_risk_overview(por_estado: bool) -> Optional[dict]:
+    """Carregar todos os pontos e calcular o risco por região (bloqueante)"""
+    db = SessionLocal()
+    try:
+        return fire_risk.compute_fire_risk_overview(db, por_estado)
+    finally:
+        db.close()
+
+async def _fire_risk_overview(por_estado: bool) -> dict:
+    """Execução compartilhada pelas requisições idênticas"""
+    result = await run_in_threadpool(_load_fire_risk_overview, por_estado)
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="Nenhum dado de monitoramento encontrado")
+
+    return result
+
+@router.get("/fire-risk", response_model=FireRiskOverviewResponse)
+async def get_fire_risk_overview(por_estado: bool = False):
+    """Risco de incêndio de todas as regiões (e opcionalmente por estado) em uma única passada
+
+    Requisições idênticas simultâneas compartilham o mesmo cálculo em andamento.
+    """
+    try:
+        result = await overview_flight.do(por_estado, lambda: _fire_risk_overview(por_estado))
+
+        estados = None
+        if result["estados"] is not None:
+            estados = {
+                regiao: {estado: FireRiskResponse(**r) for estado, r in results.items()}
+                for regiao, results in result["estados"].items()
+            }
+
+        return FireRiskOverviewResponse(
+            pontos_analisados=result["pontos_analisados"],
+            regioes={regiao: FireRiskResponse(**r) for regiao, r in result["regioes"].items()},
+            estados=estados,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular visão geral de risco: {str(e)}")
+
+def _load_region_fire_risk(regiao: str, deadline: Optional[float]) -> Optional[dict]:
+    """Carregar os pontos da região e calcular o risco (bloqueante)"""
+    # Sessão própria: a execução pode sobreviver à requisição que a iniciou
+    db = SessionLocal()
+    try:
+        return fire_risk.compute_fire_risk(db, regiao, deadline, cache_key=regiao)
+    finally:
+        db.close()
+
+async def _region_fire_risk(regiao: str, deadline: Optional[float]) -> dict:
+    """Execução compartilhada pelas requisições idênticas"""
+    # Fora do event loop: enquanto a carga roda, novas requisições continuam
+    # sendo aceitas e se juntam ao future em andamento
+    result = await run_in_threadpool(_load_region_fire_risk, regiao, deadline)
+    
+    if result is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Nenhum dado encontrado para região: {regiao}"
+        )
+    
+    return result
+
 @router.get("/fire-risk/{regiao}", response_model=FireRiskResponse)
 async def get_fire_risk_by_region(
     regiao: str,
-    db: Session = Depends(get_db)
+    budget_ms: Optional[float] = BUDGET_QUERY
 ):
-    """Obter risco de incêndio por região específica"""
+    """Obter risco de incêndio por região específica
+
+    Requisições idênticas simultâneas compartilham o mesmo cálculo em andamento.
+    """
+    started = time.perf_counter()
     try:
         # Validar região
         valid_regions = ['amazonia', 'cerrado', 'caatinga', 'pantanal', 'mata_atlantica']
         if regiao not in valid_regions:
             raise HTTPException(status_code=400, detail=f"Região inválida. Use: {valid_regions}")
         
-        ai_engine = AIEngine()
-        
-        points = db.query(MonitoringPointModel).filter(
-            MonitoringPointModel.regiao == regiao
-        ).all()
-        
-        if not points:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Nenhum dado encontrado para região: {regiao}"
-            )
-        
-        result = await ai_engine.calculate_fire_risk(points)
+        budget = DEFAULT_BUDGET_MS if budget_ms is None else budget_ms
+        deadline = compute_deadline(budget_ms, started)
+        result = await region_flight.do(
+            (regiao, budget),
+            lambda: _region_fire_risk(regiao, deadline),
+        )
         return FireRiskResponse(**result)
     except HTTPException:
         raise
@@ -94,7 +181,7 @@ async def analyze_custom_data(points_data: List[dict]):
         if len(points_data) > 100:
             raise HTTPException(status_code=400, detail="Máximo 100 pontos por análise")
         
-        ai_engine = AIEngine()
+        ai_engine = get_ai_engine()
         result = await ai_engine.calculate_fire_risk(points_data)
         return FireRiskResponse(**result)
     except HTTPException:
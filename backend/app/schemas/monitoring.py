@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 from enum import Enum
 
 class RiskLevel(str, Enum):
@@ -64,4 +64,15 @@ class FireRiskResponse(BaseModel):
     pontos_analisados: int
     fwi_medio: Optional[float] = None
     haines_medio: Optional[float] = None
-    ensemble_score: Optional[float] = None
\ No newline at end of file
+    ensemble_score: Optional[float] = None
+    # Modo degradado (orçamento de latência)
+    aproximado: bool = False
+    estrategia: str = "completo"
+    pontos_totais: Optional[int] = None
+    margem_erro: Optional[float] = None
+    idade_cache_s: Optional[float] = None
+
+class FireRiskOverviewResponse(BaseModel):
+    pontos_analisados: int
+    regioes: Dict[str, FireRiskResponse]
+    estados: Optional[Dict[str, Dict[str, FireRiskResponse]]] = None
\ No newline at end of file
@@ -1 +1,21 @@
-# Services package
\ No newline at end of file
+# Services package
+import threading
+
+_ai_engine = None
+_ai_engine_lock = threading.Lock()
+
+
+def get_ai_engine():
+    """Instância compartilhada do AIEngine, importada sob demanda (numpy é pesado)
+
+    A construção é serializada: o aquecimento do startup e uma requisição
+    concorrente recebem a mesma instância (o engine guarda cache e custos).
+    """
+    global _ai_engine
+    if _ai_engine is None:
+        with _ai_engine_lock:
+            if _ai_engine is None:
+                from .ai_engine import AIEngine
+
+                _ai_engine = AIEngine()
+    return _ai_engine
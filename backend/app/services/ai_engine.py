@@ -1,8 +1,17 @@
 import numpy as np
 import math
+import time
+from collections import Counter
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Hashable, Iterable, Optional, Sequence, Tuple
 from ..schemas.monitoring import MonitoringPoint
+from .. import metrics
+
+# Modo degradado por prazo (deadline)
+DEFAULT_SECONDS_PER_POINT = 2e-5
+COST_EWMA_ALPHA = 0.2
+DEADLINE_SAFETY_FACTOR = 0.8
+MIN_SAMPLE_SIZE = 30
 
 class AIEngine:
     """Motor de IA integrado para análise de riscos de incêndio"""
@@ -23,6 +32,11 @@ class AIEngine:
             7: 1.5, 8: 1.5, 9: 1.4, 10: 1.2, 11: 1.0, 12: 0.8
         }
 
+        # Custo estimado por ponto e último resultado completo por chave
+        self._seconds_per_point = DEFAULT_SECONDS_PER_POINT
+        self.min_sample_size = MIN_SAMPLE_SIZE
+        self._result_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
     def calculate_fwi_index(self, temp: float, humidity: float, wind: float) -> float:
         """Fire Weather Index - padrão internacional"""
         ffmc = 85 + 0.0365 * temp - 0.0365 * humidity
@@ -76,76 +90,224 @@ class AIEngine:
         probability = 1 / (1 + math.exp(-z))
         return min(100, probability * 100)
 
-    async def calculate_fire_risk(self, points: List[MonitoringPoint]) -> Dict[str, Any]:
+    async def calculate_fire_risk(
+        self,
+        points: List[MonitoringPoint],
+        cache_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """Cálculo principal de risco de incêndio"""
-        if not points:
-            return {
-                'probabilidade_incendio': 0.0,
-                'metodologia': 'Sem dados disponíveis',
-                'pontos_analisados': 0
-            }
-
-        fwi_scores = []
-        haines_scores = []
-        logistic_scores = []
-
-        for point in points:
-            # Converter para dict homogêneo
-            if hasattr(point, "dict"):
-                point_dict = point.dict()
-            elif isinstance(point, dict):
-                point_dict = point
-            else:
-                point_dict = {
-                    "temperatura": getattr(point, "temperatura", 0),
-                    "umidade": getattr(point, "umidade", 0),
-                    "nivel_fumaca": getattr(point, "nivel_fumaca", 0),
-                    "velocidade_vento": getattr(point, "velocidade_vento", 0),
-                    "nivel_risco": getattr(point, "nivel_risco", "baixo"),
-                    "regiao": getattr(point, "regiao", "cerrado"),
+        return self.calculate_fire_risk_full(points, cache_key)
+
+    def calculate_fire_risk_full(
+        self,
+        points: List[Any],
+        cache_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Ensemble sobre todos os pontos
+
+        Com ``cache_key`` o resultado é guardado para o modo degradado.
+        """
+        with metrics.AI_ENGINE_SECONDS.time(operation="calculate_fire_risk"):
+            if not points:
+                return {
+                    'probabilidade_incendio': 0.0,
+                    'metodologia': 'Sem dados disponíveis',
+                    'pontos_analisados': 0
                 }
 
-            regiao_slug = str(point_dict.get("regiao", "cerrado")).lower().replace(" ", "_")
-            weights = self.regional_weights.get(regiao_slug, self.regional_weights['cerrado'])
+            result = self._calculate_full(points)
+            if cache_key is not None:
+                self.cache_result(cache_key, result)
+            return result
 
-            temp = float(point_dict.get('temperatura', 0))
-            humidity = float(point_dict.get('umidade', 0))
-            wind = float(point_dict.get('velocidade_vento', 0))
+    # Modo degradado: o custo é estimado antes de consultar o banco
 
-            fwi = self.calculate_fwi_index(temp, humidity, wind)
-            haines = self.calculate_haines_index(temp, humidity)
-            logistic = self.calculate_logistic_probability(point_dict)
-            
-            fwi_scores.append(fwi)
-            haines_scores.append(haines)
-            logistic_scores.append(logistic)
+    def estimate_seconds(self, points: int) -> float:
+        """Tempo previsto para carregar e avaliar ``points`` pontos"""
+        return points * self._seconds_per_point
 
-        # Ensemble dos modelos
-        fwi_avg = np.mean(fwi_scores)
-        haines_avg = np.mean(haines_scores)
-        logistic_avg = np.mean(logistic_scores)
+    def affordable_points(self, remaining: float) -> int:
+        """Quantos pontos cabem no tempo restante (com margem de segurança)"""
+        return int(max(remaining, 0.0) * DEADLINE_SAFETY_FACTOR / self._seconds_per_point)
+
+    def record_cost(self, points: int, seconds: float) -> None:
+        """Atualizar o custo por ponto (média móvel) com uma carga + cálculo completos"""
+        if points > 0:
+            self._seconds_per_point += COST_EWMA_ALPHA * (seconds / points - self._seconds_per_point)
+
+    def cache_result(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """Guardar um resultado completo para uso no modo degradado"""
+        self._result_cache[cache_key] = (time.monotonic(), result)
+
+    def cached_total(self, cache_key: Optional[str]) -> Optional[int]:
+        """Pontos do último resultado completo guardado (tamanho conhecido da população)"""
+        cached = self._result_cache.get(cache_key) if cache_key is not None else None
+        return cached[1]['pontos_analisados'] if cached is not None else None
+
+    def cached_result(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Último resultado completo marcado como aproximado, ou None"""
+        cached = self._result_cache.get(cache_key) if cache_key is not None else None
+        if cached is None:
+            return None
+        cached_at, cached_result = cached
+        metrics.AI_ENGINE_DEGRADED.inc(strategy="cache")
+        return {
+            **cached_result,
+            'aproximado': True,
+            'estrategia': 'cache',
+            'idade_cache_s': round(time.monotonic() - cached_at, 1),
+        }
+
+    @staticmethod
+    def allocate_sample(strata_sizes: Dict[Any, int], sample_size: int) -> Dict[Any, int]:
+        """Alocação proporcional da amostra entre os estratos (ao menos 1 por estrato)"""
+        total = sum(strata_sizes.values())
+        return {
+            level: min(size, max(1, round(sample_size * size / total)))
+            for level, size in strata_sizes.items()
+            if size > 0
+        }
+
+    def _normalise_point(self, point: Any) -> Dict[str, Any]:
+        """Converter para dict homogêneo"""
+        if hasattr(point, "dict"):
+            return point.dict()
+        if isinstance(point, dict):
+            return point
+        return {
+            "temperatura": getattr(point, "temperatura", 0),
+            "umidade": getattr(point, "umidade", 0),
+            "nivel_fumaca": getattr(point, "nivel_fumaca", 0),
+            "velocidade_vento": getattr(point, "velocidade_vento", 0),
+            "nivel_risco": getattr(point, "nivel_risco", "baixo"),
+            "regiao": getattr(point, "regiao", "cerrado"),
+        }
+
+    @staticmethod
+    def _risk_level(point: Any) -> Optional[str]:
+        return getattr(point, 'nivel_risco', None) or (
+            point.get('nivel_risco') if isinstance(point, dict) else None
+        )
+
+    def score_arrays(
+        self,
+        temp: np.ndarray,
+        humidity: np.ndarray,
+        smoke: np.ndarray,
+        wind: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Versão vetorizada dos índices FWI, Haines e logístico"""
+        # FWI (mesmas fórmulas de calculate_fwi_index)
+        ffmc = np.clip(85 + 0.0365 * temp - 0.0365 * humidity, 0, 101)
+        dmc = np.maximum(0, 20 + 0.5 * temp - 0.2 * humidity)
+        dc = np.maximum(0, 50 + 0.8 * temp - 0.3 * humidity)
+        isi = 0.208 * ffmc * (1 + wind / 10)
+        denominator = dmc + 0.4 * dc
+        bui = np.divide(
+            0.8 * dmc * dc, denominator, out=np.zeros_like(denominator), where=denominator > 0
+        )
+        fwi = 2.0 * np.log(isi + 1) + 0.45 * (bui - 50)
+        fwi = np.maximum(0, np.where(bui > 80, fwi + 0.1 * (bui - 80), fwi))
+
+        # Haines (mesmas fórmulas de calculate_haines_index)
+        stability = temp - (temp - 10)
+        moisture = temp - (temp - ((100 - humidity) / 5))
+        haines = np.clip(stability + moisture, 0, 6)
+
+        # Logístico (mesmas fórmulas de calculate_logistic_probability)
+        seasonal_factor = self.seasonal_factors.get(datetime.now().month, 1.0)
+        z = (-2.5 + 3.2 * (temp / 50) + 2.8 * ((100 - humidity) / 100) +
+             1.5 * (smoke / 100) + 0.8 * (wind / 30) + 1.2 * (seasonal_factor - 1))
+        logistic = np.minimum(100, 100 / (1 + np.exp(-z)))
 
+        return fwi, haines, logistic
+
+    @staticmethod
+    def _column(values: Iterable[Any]) -> np.ndarray:
+        # Leituras ausentes (None) contam como 0
+        return np.nan_to_num(np.array(list(values), dtype=float), copy=False)
+
+    def _score_points(self, points: List[Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Índices FWI, Haines e logístico de cada ponto"""
+        point_dicts = [self._normalise_point(point) for point in points]
+        scores = self.score_arrays(
+            self._column(d.get('temperatura', 0) for d in point_dicts),
+            self._column(d.get('umidade', 0) for d in point_dicts),
+            self._column(d.get('nivel_fumaca', 0) for d in point_dicts),
+            self._column(d.get('velocidade_vento', 0) for d in point_dicts),
+        )
+        metrics.AI_ENGINE_POINTS.inc(len(points), operation="calculate_fire_risk")
+        return scores
+
+    def calculate_fire_risk_grouped(
+        self,
+        rows: Sequence[Sequence[Any]],
+        groupings: Sequence[Callable[[Sequence[Any]], Hashable]],
+    ) -> List[Dict[Hashable, Dict[str, Any]]]:
+        """Ensemble para vários grupos em uma única passada vetorizada
+
+        ``rows`` são tuplas (temperatura, umidade, nivel_fumaca,
+        velocidade_vento, nivel_risco, ...). Cada função em ``groupings``
+        extrai a chave de grupo de uma linha; o retorno tem, para cada
+        agrupamento, um dict chave -> resultado no mesmo formato de
+        calculate_fire_risk.
+        """
+        with metrics.AI_ENGINE_SECONDS.time(operation="calculate_fire_risk_grouped"):
+            if not rows:
+                return [{} for _ in groupings]
+
+            temp, humidity, smoke, wind, risk = (list(c) for c in zip(*(r[:5] for r in rows)))
+            fwi, haines, logistic = self.score_arrays(
+                self._column(temp), self._column(humidity), self._column(smoke), self._column(wind)
+            )
+            critical = np.array([level == 'critico' for level in risk], dtype=float)
+            high = np.array([level == 'alto' for level in risk], dtype=float)
+            metrics.AI_ENGINE_POINTS.inc(len(rows), operation="calculate_fire_risk_grouped")
+
+            results = []
+            for key_of in groupings:
+                index: Dict[Hashable, int] = {}
+                inverse = np.fromiter(
+                    (index.setdefault(key_of(r), len(index)) for r in rows),
+                    dtype=np.intp,
+                    count=len(rows),
+                )
+                counts = np.bincount(inverse, minlength=len(index))
+                sums = [
+                    np.bincount(inverse, weights=values, minlength=len(index))
+                    for values in (fwi, haines, logistic, critical, high)
+                ]
+                results.append({
+                    key: self._ensemble(
+                        sums[0][i] / counts[i],
+                        sums[1][i] / counts[i],
+                        sums[2][i] / counts[i],
+                        {'critico': int(sums[3][i]), 'alto': int(sums[4][i])},
+                        int(counts[i]),
+                    )
+                    for key, i in index.items()
+                })
+            return results
+
+    def _ensemble(
+        self,
+        fwi_avg: float,
+        haines_avg: float,
+        logistic_avg: float,
+        risk_counts: Dict[Any, int],
+        total: int,
+    ) -> Dict[str, Any]:
         ensemble_probability = (
             0.4 * logistic_avg +
             0.3 * min(100, fwi_avg * 10) +
             0.3 * min(100, haines_avg * 16.67)
         )
 
-        # Ajuste por pontos críticos
-        critical_points = sum(
-            1
-            for p in points
-            if (getattr(p, 'nivel_risco', None) or (p.get('nivel_risco') if isinstance(p, dict) else None))
-            == 'critico'
-        )
-        high_points = sum(
-            1
-            for p in points
-            if (getattr(p, 'nivel_risco', None) or (p.get('nivel_risco') if isinstance(p, dict) else None))
-            == 'alto'
-        )
+        # Ajuste por pontos críticos (sempre sobre todos os pontos)
+        critical_points = risk_counts.get('critico', 0)
+        high_points = risk_counts.get('alto', 0)
 
-        adjustment = (critical_points / len(points)) * 15 + (high_points / len(points)) * 8
+        adjustment = (critical_points / total) * 15 + (high_points / total) * 8
         final_probability = min(100, ensemble_probability + adjustment)
 
         return {
@@ -154,5 +316,73 @@ class AIEngine:
             'haines_medio': round(haines_avg, 2),
             'ensemble_score': round(ensemble_probability, 2),
             'metodologia': 'Ensemble: FWI + Haines + Logístico + Ajuste Bayesiano',
-            'pontos_analisados': len(points)
-        }
\ No newline at end of file
+            'pontos_analisados': total
+        }
+
+    def _calculate_full(self, points: List[Any]) -> Dict[str, Any]:
+        fwi, haines, logistic = self._score_points(points)
+
+        risk_counts = Counter(self._risk_level(p) for p in points)
+
+        # Ensemble dos modelos
+        return self._ensemble(
+            np.mean(fwi), np.mean(haines), np.mean(logistic), risk_counts, len(points)
+        )
+
+    def calculate_fire_risk_stratified(
+        self,
+        rows: Sequence[Sequence[Any]],
+        strata_sizes: Dict[Any, int],
+    ) -> Dict[str, Any]:
+        """Estimativa a partir de uma amostra estratificada por nivel_risco
+
+        ``rows`` são tuplas (temperatura, umidade, nivel_fumaca,
+        velocidade_vento, nivel_risco, ...) amostradas de cada estrato;
+        ``strata_sizes`` traz o tamanho exato de cada estrato na população.
+        """
+        with metrics.AI_ENGINE_SECONDS.time(operation="calculate_fire_risk"):
+            total = sum(strata_sizes.values())
+            by_level: Dict[Any, List[Sequence[Any]]] = {}
+            for row in rows:
+                by_level.setdefault(row[4], []).append(row)
+
+            sampled = [row for level_rows in by_level.values() for row in level_rows]
+            temp, humidity, smoke, wind = (list(c) for c in zip(*(r[:4] for r in sampled)))
+            fwi, haines, logistic = self.score_arrays(
+                self._column(temp), self._column(humidity), self._column(smoke), self._column(wind)
+            )
+            metrics.AI_ENGINE_POINTS.inc(len(sampled), operation="calculate_fire_risk")
+
+            # Peso de cada ponto amostrado: W_h / n_h
+            layout = [(strata_sizes.get(level, 0), len(level_rows)) for level, level_rows in by_level.items()]
+            w = np.concatenate([np.full(n_h, size / total / n_h) for size, n_h in layout])
+            # Estratos sem amostra (ex.: esvaziados entre a contagem e o sorteio) saem da média
+            w /= w.sum()
+
+            # Contribuição linearizada de cada ponto ao ensemble, para a margem de erro
+            contributions = 0.4 * logistic + 3.0 * fwi + 5.001 * haines
+            variance = 0.0
+            offset = 0
+            for stratum_size, n_h in layout:
+                if 1 < n_h <= stratum_size:
+                    s2 = float(np.var(contributions[offset:offset + n_h], ddof=1))
+                    variance += (stratum_size / total) ** 2 * (1 - n_h / stratum_size) * s2 / n_h
+                offset += n_h
+
+            result = self._ensemble(
+                float(np.dot(w, fwi)),
+                float(np.dot(w, haines)),
+                float(np.dot(w, logistic)),
+                strata_sizes,
+                total,
+            )
+            result.update({
+                'metodologia': result['metodologia'] + ' (amostra estratificada por nível de risco)',
+                'pontos_analisados': len(sampled),
+                'pontos_totais': total,
+                'aproximado': True,
+                'estrategia': 'amostra_estratificada',
+                'margem_erro': round(1.96 * math.sqrt(variance), 2),
+            })
+            metrics.AI_ENGINE_DEGRADED.inc(strategy="amostra_estratificada")
+            return result
@@ -0,0 +1,164 @@
+"""
+Cálculo de risco de incêndio de uma região com orçamento de latência.
+
+A estratégia é decidida antes de carregar os pontos, porque a carga do
+banco é a parte cara (a avaliação é uma passada vetorizada):
+
+1. se nem uma amostra mínima cabe no prazo e há um resultado completo em
+   cache cuja população não cabe, o cache é devolvido sem consultar o banco;
+2. caso contrário um ``GROUP BY nivel_risco`` dá o tamanho exato de cada
+   estrato; se a carga completa cabe no prazo, todos os pontos são avaliados;
+3. senão, uma amostra estratificada é sorteada no próprio banco (Bernoulli
+   com a fração de cada estrato) e só ela é carregada. O tempo da contagem
+   estima o custo dessa varredura; se nem ela cabe, vale o cache.
+
+A visão geral (todas as regiões) é sempre completa, em uma única passada.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from ..models.monitoring import MonitoringPoint as MonitoringPointModel
+from . import get_ai_engine
+
+
+def _population(regiao: Optional[str], limit: Optional[int]):
+    """Pontos considerados no cálculo (apenas as colunas usadas)"""
+    m = MonitoringPointModel
+    query = select(m.temperatura, m.umidade, m.nivel_fumaca, m.velocidade_vento, m.nivel_risco)
+    if regiao:
+        query = query.where(m.regiao == regiao)
+    if limit:
+        # Ordem fixa para que contagem, amostra e carga vejam os mesmos pontos
+        query = query.order_by(m.id).limit(limit)
+    return query.subquery()
+
+
+def _stratified_sample(db: Session, population, allocation: Dict[Any, int], strata_sizes: Dict[Any, int]):
+    """Sortear cerca de ``allocation[nivel]`` pontos de cada estrato no banco
+
+    Cada ponto entra com probabilidade n_h / N_h do seu estrato (Bernoulli):
+    uma única varredura, sem ordenar a população.
+    """
+    c = population.c
+    fraction = case(
+        *[
+            (c.nivel_risco.is_(None) if level is None else c.nivel_risco == level, size / strata_sizes[level])
+            for level, size in allocation.items()
+        ],
+        else_=0.0,
+    )
+    return db.execute(select(population).where(func.random() < fraction)).all()
+
+
+def _calculate_full(db: Session, population, cache_key: str) -> Optional[Dict[str, Any]]:
+    ai_engine = get_ai_engine()
+    started = time.perf_counter()
+    rows = db.execute(select(population)).all()
+    if not rows:
+        return None
+    result = ai_engine.calculate_fire_risk_full(rows, cache_key=cache_key)
+    ai_engine.record_cost(len(rows), time.perf_counter() - started)
+    return result
+
+
+def compute_fire_risk(
+    db: Session,
+    regiao: Optional[str],
+    deadline: Optional[float],
+    cache_key: str,
+    limit: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """Risco de incêndio dos pontos da região (None se não houver pontos)
+
+    ``deadline`` é um instante de ``time.perf_counter()``; sem ele todos os
+    pontos são sempre avaliados.
+    """
+    population = _population(regiao, limit)
+    if deadline is None:
+        return _calculate_full(db, population, cache_key)
+
+    ai_engine = get_ai_engine()
+    remaining = deadline - time.perf_counter()
+    known_total = ai_engine.cached_total(cache_key)
+    if (
+        known_total is not None
+        and ai_engine.estimate_seconds(known_total) > remaining
+        and ai_engine.affordable_points(remaining) < ai_engine.min_sample_size
+    ):
+        return ai_engine.cached_result(cache_key)
+
+    started = time.perf_counter()
+    strata_sizes = dict(db.execute(
+        select(population.c.nivel_risco, func.count()).group_by(population.c.nivel_risco)
+    ).all())
+    scan_seconds = time.perf_counter() - started
+    total = sum(strata_sizes.values())
+    if total == 0:
+        return None
+
+    remaining = deadline - time.perf_counter()
+    if ai_engine.estimate_seconds(total) <= remaining:
+        return _calculate_full(db, population, cache_key)
+
+    # A amostra também varre a população: o custo da contagem sai do orçamento
+    affordable = ai_engine.affordable_points(remaining - scan_seconds)
+    if affordable < ai_engine.min_sample_size:
+        cached = ai_engine.cached_result(cache_key)
+        if cached is not None:
+            return cached
+
+    sample_size = max(affordable, ai_engine.min_sample_size)
+    if sample_size >= total:
+        return _calculate_full(db, population, cache_key)
+
+    allocation = ai_engine.allocate_sample(strata_sizes, sample_size)
+    rows = _stratified_sample(db, population, allocation, strata_sizes)
+    if not rows:
+        # Sorteio vazio (improvável com a amostra mínima)
+        return ai_engine.cached_result(cache_key) or _calculate_full(db, population, cache_key)
+    return ai_engine.calculate_fire_risk_stratified(rows, strata_sizes)
+
+
+def _region_key(row) -> str:
+    return getattr(row.regiao, "name", row.regiao)
+
+
+def compute_fire_risk_overview(db: Session, por_estado: bool = False) -> Optional[Dict[str, Any]]:
+    """Risco de todas as regiões (e opcionalmente por estado) em uma passada
+
+    Devolve ``pontos_analisados``, ``regioes`` (região -> resultado) e
+    ``estados`` (região -> estado -> resultado, ou None); None sem pontos.
+    """
+    m = MonitoringPointModel
+    # Uma consulta só com as colunas usadas no cálculo
+    rows = db.execute(
+        select(
+            m.temperatura, m.umidade, m.nivel_fumaca, m.velocidade_vento, m.nivel_risco,
+            m.regiao, m.estado,
+        ).where(m.regiao.isnot(None))
+    ).all()
+    if not rows:
+        return None
+
+    groupings = [_region_key]
+    if por_estado:
+        groupings.append(lambda row: (_region_key(row), row.estado or "Não informado"))
+
+    ai_engine = get_ai_engine()
+    results = ai_engine.calculate_fire_risk_grouped(rows, groupings)
+
+    # Mesmo resultado de /fire-risk/{regiao}: serve de cache para o modo degradado
+    for regiao, result in results[0].items():
+        ai_engine.cache_result(regiao, result)
+
+    estados = None
+    if por_estado:
+        estados = {}
+        for (regiao, estado), result in results[1].items():
+            estados.setdefault(regiao, {})[estado] = result
+
+    return {"pontos_analisados": len(rows), "regioes": results[0], "estados": estados}
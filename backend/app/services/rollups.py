@@ -0,0 +1,225 @@
+"""
+Retenção e downsampling das leituras de monitoramento.
+
+Leituras mais antigas que ``RAW_RETENTION_DAYS`` são agregadas em
+``monitoring_rollups`` (por hora e por dia, por região/estado: média, mínimo
+e máximo de cada sensor e contagem por nível de risco) e, opcionalmente,
+removidas de ``monitoring_points``. A compactação processa sempre dias
+inteiros a partir do último dia já agregado, então pode ser repetida sem
+duplicar dados; leituras que chegarem depois com data já compactada não
+são incorporadas.
+
+As séries históricas leem os agregados antes da fronteira de compactação
+e a tabela bruta depois dela, sem sobreposição.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, literal_column, select
+
+from .. import metrics
+from ..database import engine
+from ..models.monitoring import MonitoringPoint as MonitoringPointModel
+from ..models.monitoring import MonitoringRollup
+from ..models.versioning import bump_versions
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day")
+SENSORS = ("temperatura", "umidade", "nivel_fumaca", "velocidade_vento")
+RISK_LEVELS = ("baixo", "medio", "alto", "critico")
+
+# Chave do advisory lock que impede compactações simultâneas entre workers
+ADVISORY_LOCK_KEY = 7_351_001
+
+
+class CompactionConfig:
+    """Configuração lida das variáveis de ambiente"""
+
+    def __init__(self):
+        self.enabled = os.getenv("COMPACTION_ENABLED", "false").lower() == "true"
+        self.retention_days = int(os.getenv("RAW_RETENTION_DAYS", 30))
+        self.prune = os.getenv("COMPACTION_PRUNE", "false").lower() == "true"
+        self.interval_seconds = int(os.getenv("COMPACTION_INTERVAL_SECONDS", 3600))
+
+
+config = CompactionConfig()
+
+
+def _trunc(granularity: str, column):
+    # Literal (e não parâmetro) para que a expressão seja idêntica no SELECT e no GROUP BY
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidade inválida: {granularity}")
+    return func.date_trunc(literal_column(f"'{granularity}'"), column)
+
+
+def compacted_until(conn) -> Optional[datetime]:
+    """Instante até o qual as leituras já foram agregadas (exclusivo)"""
+    last_day = conn.execute(
+        select(func.max(MonitoringRollup.periodo)).where(MonitoringRollup.granularidade == "day")
+    ).scalar()
+    return last_day + timedelta(days=1) if last_day is not None else None
+
+
+def compact_readings(retention_days: int, prune: bool = False) -> Dict[str, Any]:
+    """Agregar (e opcionalmente remover) leituras mais antigas que a retenção"""
+    p = MonitoringPointModel
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            locked = conn.execute(select(func.pg_try_advisory_xact_lock(ADVISORY_LOCK_KEY))).scalar()
+            if not locked:
+                metrics.COMPACTION_RUNS.inc(status="skipped")
+                return {"status": "skipped"}
+
+        cutoff = conn.execute(
+            select(_trunc("day", func.now() - timedelta(days=retention_days)))
+        ).scalar()
+        start = compacted_until(conn)
+        if start is not None and start >= cutoff:
+            metrics.COMPACTION_RUNS.inc(status="noop")
+            return {"status": "noop", "ate": cutoff}
+
+        window = [p.data_medicao < cutoff]
+        if start is not None:
+            window.append(p.data_medicao >= start)
+
+        target_columns = ["granularidade", "periodo", "regiao", "estado", "total"]
+        for sensor in SENSORS:
+            target_columns += [f"{sensor}_media", f"{sensor}_min", f"{sensor}_max"]
+        target_columns += [f"risco_{level}" for level in RISK_LEVELS]
+
+        inserted = {}
+        for granularity in GRANULARITIES:
+            period = _trunc(granularity, p.data_medicao)
+            aggregates = [func.count()]
+            for sensor in SENSORS:
+                column = getattr(p, sensor)
+                aggregates += [func.avg(column), func.min(column), func.max(column)]
+            aggregates += [func.count().filter(p.nivel_risco == level) for level in RISK_LEVELS]
+
+            rollup_select = (
+                select(literal_column(f"'{granularity}'"), period, p.regiao, p.estado, *aggregates)
+                .where(*window)
+                .group_by(period, p.regiao, p.estado)
+            )
+            result = conn.execute(
+                insert(MonitoringRollup.__table__).from_select(target_columns, rollup_select)
+            )
+            inserted[granularity] = result.rowcount
+            metrics.COMPACTION_ROWS.inc(result.rowcount, kind=f"rollup_{granularity}")
+
+        pruned = 0
+        if prune:
+            pruned = conn.execute(delete(p.__table__).where(*window)).rowcount
+            metrics.COMPACTION_ROWS.inc(pruned, kind="pruned")
+
+    if pruned:
+        # Transação curta após o commit, como nas sessões (ver models.versioning)
+        bump_versions(engine, [p.__tablename__])
+
+    metrics.COMPACTION_RUNS.inc(status="ok")
+    logger.info(
+        f"Compactação até {cutoff}: {inserted['hour']} agregados por hora, "
+        f"{inserted['day']} por dia, {pruned} leituras removidas"
+    )
+    return {
+        "status": "ok",
+        "desde": start,
+        "ate": cutoff,
+        "agregados_hora": inserted["hour"],
+        "agregados_dia": inserted["day"],
+        "leituras_removidas": pruned,
+    }
+
+
+async def compaction_loop(interval_seconds: int, retention_days: int, prune: bool) -> None:
+    """Executar a compactação periodicamente em segundo plano"""
+    while True:
+        try:
+            await asyncio.to_thread(compact_readings, retention_days, prune)
+        except Exception as e:
+            metrics.COMPACTION_RUNS.inc(status="error")
+            logger.error(f"Erro na compactação de leituras: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def _history_row(row, source: str) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"periodo": row.periodo, "total": int(row.total), "fonte": source}
+    for sensor in SENSORS:
+        mean = getattr(row, f"{sensor}_media")
+        entry[sensor] = {
+            "media": round(float(mean), 2) if mean is not None else None,
+            "min": getattr(row, f"{sensor}_min"),
+            "max": getattr(row, f"{sensor}_max"),
+        }
+    entry["por_nivel_risco"] = {level: int(getattr(row, f"risco_{level}")) for level in RISK_LEVELS}
+    return entry
+
+
+def sensor_history(
+    db,
+    bucket: str,
+    since: datetime,
+    until: datetime,
+    regiao: Optional[str] = None,
+    estado: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Série histórica dos sensores: agregados antes da fronteira, leituras brutas depois"""
+    boundary = compacted_until(db)
+    series: List[Dict[str, Any]] = []
+
+    if boundary is not None and since < boundary:
+        r = MonitoringRollup
+        total = func.sum(r.total)
+        columns = [r.periodo, total.label("total")]
+        for sensor in SENSORS:
+            # Média ponderada pelo número de leituras de cada grupo
+            columns += [
+                (func.sum(getattr(r, f"{sensor}_media") * r.total) / total).label(f"{sensor}_media"),
+                func.min(getattr(r, f"{sensor}_min")).label(f"{sensor}_min"),
+                func.max(getattr(r, f"{sensor}_max")).label(f"{sensor}_max"),
+            ]
+        columns += [func.sum(getattr(r, f"risco_{level}")).label(f"risco_{level}") for level in RISK_LEVELS]
+
+        query = select(*columns).where(
+            r.granularidade == bucket, r.periodo >= since, r.periodo < min(until, boundary)
+        )
+        if regiao:
+            query = query.where(r.regiao == regiao)
+        if estado:
+            query = query.where(r.estado == estado)
+        series += [_history_row(row, "rollup") for row in db.execute(query.group_by(r.periodo))]
+
+    raw_since = max(since, boundary) if boundary is not None else since
+    if raw_since < until:
+        p = MonitoringPointModel
+        period = _trunc(bucket, p.data_medicao)
+        columns = [period.label("periodo"), func.count().label("total")]
+        for sensor in SENSORS:
+            column = getattr(p, sensor)
+            columns += [
+                func.avg(column).label(f"{sensor}_media"),
+                func.min(column).label(f"{sensor}_min"),
+                func.max(column).label(f"{sensor}_max"),
+            ]
+        columns += [
+            func.count().filter(p.nivel_risco == level).label(f"risco_{level}") for level in RISK_LEVELS
+        ]
+
+        query = select(*columns).where(p.data_medicao >= raw_since, p.data_medicao < until)
+        if regiao:
+            query = query.where(p.regiao == regiao)
+        if estado:
+            query = query.where(p.estado == estado)
+        series += [_history_row(row, "bruto") for row in db.execute(query.group_by(period))]
+
+    return sorted(series, key=lambda entry: entry["periodo"])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(compact_readings(config.retention_days, config.prune))
@@ -0,0 +1,36 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from .. import metrics
+
+
+class SingleFlight:
+    """Compartilha uma execução em andamento entre chamadas idênticas concorrentes
+
+    Enquanto a primeira chamada para uma chave não termina, as demais
+    aguardam o mesmo resultado (ou a mesma exceção). Nada é guardado depois
+    que a execução termina, então nenhuma resposta fica desatualizada.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+            metrics.SINGLEFLIGHT_CALLS.inc(flight=self.name, role="leader")
+        else:
+            metrics.SINGLEFLIGHT_CALLS.inc(flight=self.name, role="coalesced")
+
+        # shield: o cancelamento de um cliente não cancela a execução dos demais
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Evita o aviso "exception was never retrieved" se todos desistirem
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,192 @@
+"""
+Estatísticas agregadas com uma única varredura por tabela.
+
+Cada resumo é uma consulta com GROUPING SETS: a mesma leitura da tabela
+produz o total geral, as contagens por dimensão e as contagens por período.
+Agregados com FILTER evitam consultas extras para subconjuntos (ex.: alertas
+ativos). Os totais e as séries de monitoramento somam as leituras brutas
+posteriores à fronteira de compactação e os agregados de monitoring_rollups
+anteriores a ela, na mesma consulta, então continuam corretos depois que as
+leituras antigas são removidas. Requer PostgreSQL.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    Integer, case, cast, column, func, literal, null, or_, select, true, tuple_, union_all, values,
+)
+from sqlalchemy.orm import Session
+
+from ..models.monitoring import Alert as AlertModel
+from ..models.monitoring import MonitoringPoint as MonitoringPointModel
+from ..models.monitoring import MonitoringRollup
+from .rollups import RISK_LEVELS
+
+HIGH_RISK_LEVELS = ("alto", "critico")
+
+
+def _bucket_expr(column, bucket: str, since: datetime):
+    # Leituras fora da janela ficam com período NULL e são descartadas
+    return case((column >= since, func.date_trunc(bucket, column)), else_=None)
+
+
+def _grouped_rows(db: Session, dims: List, aggregates: List):
+    """Executar GROUPING SETS ((dim1), (dim2), ..., ()) com os agregados dados"""
+    stmt = select(
+        *dims,
+        func.grouping(*dims).label("grupo"),
+        *aggregates,
+    ).group_by(func.grouping_sets(*[tuple_(d) for d in dims], tuple_()))
+
+    # GROUPING(d1, ..., dn) liga o bit de cada dimensão agregada (d1 é o mais alto)
+    full_mask = (1 << len(dims)) - 1
+    dim_masks = [full_mask ^ (1 << (len(dims) - 1 - i)) for i in range(len(dims))]
+    return db.execute(stmt).all(), full_mask, dim_masks
+
+
+def _monitoring_rows(bucket: Optional[str], since: Optional[datetime]):
+    """Leituras como linhas (regiao, nivel_risco, periodo, peso)
+
+    Leituras brutas têm peso 1 e só entram a partir da fronteira de
+    compactação; antes dela cada agregado vira uma linha por nível de risco
+    (VALUES lateral: uma só varredura de monitoring_rollups), com peso igual
+    à contagem daquele nível.
+    """
+    m = MonitoringPointModel
+    r = MonitoringRollup
+    # Mesma fronteira de rollups.compacted_until, calculada uma vez (sempre uma linha)
+    boundary = (
+        select((func.max(r.periodo) + timedelta(days=1)).label("inicio"))
+        .where(r.granularidade == "day")
+        .cte("fronteira")
+    )
+
+    raw_columns = [m.regiao.label("regiao"), m.nivel_risco.label("nivel_risco")]
+    if bucket:
+        raw_columns.append(_bucket_expr(m.data_medicao, bucket, since).label("periodo"))
+    raw_columns.append(literal(1).label("peso"))
+    raw = (
+        select(*raw_columns)
+        .join_from(m, boundary, true())
+        .where(or_(boundary.c.inicio.is_(None), m.data_medicao >= boundary.c.inicio))
+    )
+
+    # Leituras sem nível de risco contam no total do agregado, mas em nenhum nível
+    level_type = m.nivel_risco.type
+    level_counts = [
+        (cast(literal(level, level_type), level_type), getattr(r, f"risco_{level}"))
+        for level in RISK_LEVELS
+    ]
+    level_counts.append((cast(null(), level_type), r.total - sum(count for _, count in level_counts)))
+    levels = (
+        values(column("nivel_risco", level_type), column("peso", Integer), name="niveis")
+        .data(level_counts)
+        .lateral()
+    )
+
+    columns = [r.regiao.label("regiao"), levels.c.nivel_risco]
+    if bucket:
+        # Agregados da mesma granularidade já estão truncados no período
+        columns.append(case((r.periodo >= since, r.periodo), else_=None).label("periodo"))
+    columns.append(levels.c.peso)
+    compacted = (
+        select(*columns)
+        .join_from(r, boundary, true())
+        .join(levels, true())
+        .where(
+            r.granularidade == (bucket or "day"),
+            or_(boundary.c.inicio.is_(None), r.periodo < boundary.c.inicio),
+            levels.c.peso > 0,
+        )
+    )
+
+    return union_all(raw, compacted).subquery()
+
+
+def monitoring_summary(
+    db: Session,
+    bucket: Optional[str] = None,
+    since: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Totais de pontos por região, nível de risco e (opcional) período"""
+    base = _monitoring_rows(bucket, since)
+
+    dims = [base.c.regiao, base.c.nivel_risco]
+    if bucket:
+        dims.append(base.c.periodo)
+    high_risk = base.c.nivel_risco.in_(HIGH_RISK_LEVELS)
+
+    rows, full_mask, dim_masks = _grouped_rows(db, dims, [
+        func.coalesce(func.sum(base.c.peso), 0).label("total"),
+        func.coalesce(func.sum(base.c.peso).filter(high_risk), 0).label("risco_elevado"),
+    ])
+
+    summary: Dict[str, Any] = {
+        "total_pontos": 0,
+        "pontos_risco_elevado": 0,
+        "por_regiao": {},
+        "por_nivel_risco": {},
+    }
+    periods = []
+    for row in rows:
+        if row.grupo == full_mask:
+            summary["total_pontos"] = int(row.total)
+            summary["pontos_risco_elevado"] = int(row.risco_elevado)
+        elif row.grupo == dim_masks[0]:
+            summary["por_regiao"][row.regiao] = int(row.total)
+        elif row.grupo == dim_masks[1]:
+            summary["por_nivel_risco"][row.nivel_risco] = int(row.total)
+        elif bucket and row.grupo == dim_masks[2] and row.periodo is not None:
+            periods.append({
+                "periodo": row.periodo,
+                "total": int(row.total),
+                "risco_elevado": int(row.risco_elevado),
+            })
+
+    if bucket:
+        summary["por_periodo"] = sorted(periods, key=lambda p: p["periodo"])
+    return summary
+
+
+def alerts_summary(
+    db: Session,
+    bucket: Optional[str] = None,
+    since: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Totais de alertas (e ativos) por criticidade e (opcional) período"""
+    a = AlertModel
+    columns = [a.nivel_criticidade.label("nivel_criticidade"), a.status.label("status")]
+    if bucket:
+        columns.append(_bucket_expr(a.created_at, bucket, since).label("periodo"))
+    base = select(*columns).subquery()
+
+    dims = [base.c.nivel_criticidade]
+    if bucket:
+        dims.append(base.c.periodo)
+
+    rows, full_mask, dim_masks = _grouped_rows(db, dims, [
+        func.count().label("total"),
+        func.count().filter(base.c.status == "ativo").label("ativos"),
+    ])
+
+    summary: Dict[str, Any] = {
+        "total_alertas": 0,
+        "alertas_ativos": 0,
+        "por_criticidade": {},
+        "ativos_por_criticidade": {},
+    }
+    periods = []
+    for row in rows:
+        if row.grupo == full_mask:
+            summary["total_alertas"] = row.total
+            summary["alertas_ativos"] = row.ativos
+        elif row.grupo == dim_masks[0]:
+            summary["por_criticidade"][row.nivel_criticidade] = row.total
+            summary["ativos_por_criticidade"][row.nivel_criticidade] = row.ativos
+        elif bucket and row.grupo == dim_masks[1] and row.periodo is not None:
+            periods.append({"periodo": row.periodo, "total": row.total, "ativos": row.ativos})
+
+    if bucket:
+        summary["por_periodo"] = sorted(periods, key=lambda p: p["periodo"])
+    return summary
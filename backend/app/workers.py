@@ -0,0 +1,16 @@
+"""
+Worker uvicorn usado pelo gunicorn em produção.
+"""
+
+from uvicorn.workers import UvicornWorker
+
+
+class ProductionUvicornWorker(UvicornWorker):
+    """Worker com uvloop e httptools fixos (incluídos em uvicorn[standard])"""
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "proxy_headers": True,
+        "access_log": False,
+    }
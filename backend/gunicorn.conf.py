@@ -0,0 +1,58 @@
+"""
+Configuração do gunicorn para produção (usada por `python run.py --profile prod`).
+
+Todos os valores podem ser ajustados por variáveis de ambiente.
+"""
+
+import os
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+
+# Workers assíncronos: um por núcleo é suficiente (não a regra 2n+1 de workers síncronos)
+workers = int(os.getenv("WEB_CONCURRENCY", _cpu_count()))
+worker_class = "app.workers.ProductionUvicornWorker"
+
+# Carrega o app uma vez no master; os workers herdam via copy-on-write
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+# Reciclagem gradual: o jitter evita que todos os workers reiniciem juntos
+max_requests = int(os.getenv("MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 1000))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+
+accesslog = os.getenv("ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Snapshots de métricas de execuções anteriores não podem somar nesta
+    from app import metrics
+
+    if metrics.MULTIPROC_DIR:
+        metrics.reset_multiprocess_dir(metrics.MULTIPROC_DIR)
+
+
+def post_fork(server, worker):
+    # Conexões abertas no master durante o preload não podem ser
+    # compartilhadas entre processos: cada worker começa com pool novo
+    from app.database import engine
+
+    engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # Contadores do worker encerrado vão para o arquivo acumulado; gauges dele somem
+    from app import metrics
+
+    metrics.mark_process_dead(worker.pid)
@@ -12,6 +12,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.models.monitoring import MonitoringPoint, Alert, Base
+from app.models import versioning  # noqa: F401 - invalida os ETags da API ao migrar
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -1,24 +1,124 @@
 #!/usr/bin/env python3
 """
 Script para executar o backend FastAPI
+
+Perfis:
+  dev  - um processo uvicorn com reload (padrão)
+  prod - gunicorn com um worker uvicorn (uvloop + httptools) por núcleo,
+         app pré-carregado e reciclagem gradual de workers (gunicorn.conf.py)
+
+Uso: python run.py [--profile dev|prod]   (ou APP_ENV=prod)
+     python run.py --migrate               (apenas aplica o schema)
 """
 
-import uvicorn
+import argparse
 import os
+import shutil
+import tempfile
 
-if __name__ == "__main__":
-    # Configurações
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", 8000))
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def cpu_count() -> int:
+    """Núcleos disponíveis para o processo (respeita affinity/cgroups)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def migrate() -> None:
+    """Aplicar o schema do banco uma única vez"""
+    from app.database import init_db
+
+    init_db()
+    print("✅ Schema aplicado")
+
+
+def run_dev(host: str, port: int) -> None:
     reload = os.getenv("RELOAD", "true").lower() == "true"
-    
-    print("🚀 Iniciando EcoMonitor Backend v2.0")
-    print(f"📡 API: http://{host}:{port}")
-    print(f"📚 Docs: http://{host}:{port}/docs")
-    
     uvicorn.run(
         "app.main:app",
         host=host,
         port=port,
         reload=reload
-    )
\ No newline at end of file
+    )
+
+
+def run_prod(host: str, port: int) -> None:
+    workers = int(os.getenv("WEB_CONCURRENCY", cpu_count()))
+    print(f"⚙️  Workers: {workers}")
+
+    # /metrics soma os snapshots de todos os workers gravados neste diretório
+    metrics_dir = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR",
+        os.path.join(tempfile.gettempdir(), f"ecomonitor-metrics-{port}"),
+    )
+    from app.metrics import reset_multiprocess_dir
+
+    reset_multiprocess_dir(metrics_dir)
+
+    # Schema aplicado uma vez aqui, e não em cada worker
+    if os.getenv("AUTO_MIGRATE", "true").lower() == "true":
+        migrate()
+        os.environ["AUTO_MIGRATE"] = "false"
+
+    gunicorn = shutil.which("gunicorn")
+    if gunicorn:
+        # Substitui o processo atual para que sinais cheguem direto ao gunicorn
+        os.chdir(BACKEND_DIR)
+        os.environ.setdefault("WEB_CONCURRENCY", str(workers))
+        os.execv(gunicorn, [
+            gunicorn,
+            "--config", "gunicorn.conf.py",
+            "--bind", f"{host}:{port}",
+            "app.main:app",
+        ])
+
+    # Sem gunicorn: uvicorn multiprocesso (sem preload nem reciclagem)
+    print("⚠️  gunicorn não encontrado, usando uvicorn --workers")
+    uvicorn.run(
+        "app.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        proxy_headers=True,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EcoMonitor Backend")
+    parser.add_argument(
+        "--profile",
+        choices=["dev", "prod"],
+        default=os.getenv("APP_ENV", "dev"),
+        help="Perfil de execução (padrão: APP_ENV ou dev)",
+    )
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="Aplicar o schema do banco e sair",
+    )
+    args = parser.parse_args()
+
+    if args.migrate:
+        migrate()
+        raise SystemExit(0)
+
+    # Configurações
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", 8000))
+
+    print(f"🚀 Iniciando EcoMonitor Backend v2.0 ({args.profile})")
+    print(f"📡 API: http://{host}:{port}")
+    print(f"📚 Docs: http://{host}:{port}/docs")
+
+    if args.profile == "prod":
+        run_prod(host, port)
+    else:
+        run_dev(host, port)
@@ -0,0 +1,24 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import services
+from app.services import ai_engine
+
+
+def test_concurrent_first_calls_build_a_single_engine(monkeypatch):
+    built = []
+
+    class SlowEngine:
+        def __init__(self):
+            built.append(threading.get_ident())
+            time.sleep(0.05)
+
+    monkeypatch.setattr(ai_engine, "AIEngine", SlowEngine)
+    monkeypatch.setattr(services, "_ai_engine", None)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        engines = list(pool.map(lambda _: services.get_ai_engine(), range(8)))
+
+    assert len(built) == 1
+    assert all(engine is engines[0] for engine in engines)
@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from app.models.monitoring import Alert, MonitoringPoint
+from app.services.rollups import compact_readings
+
+from .conftest import add_points
+
+# Consultas por requisição: a leitura de table_versions (ETag) + as de dados
+EXPECTED_QUERIES = {
+    "/api/v1/dashboard/summary": 1 + 2,
+    "/api/v1/dashboard/summary?bucket=hour&dias=60": 1 + 2,
+    "/api/v1/monitoring/stats": 1 + 1,
+    "/api/v1/alerts/stats/summary": 1 + 1,
+}
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def dashboard_data(postgres, db):
+    add_points(db, "cerrado", 40)
+    add_points(db, "amazonia", 20, estado="AM")
+    # Leituras antigas compactadas e removidas: os resumos passam a ler os agregados
+    old = datetime.now(timezone.utc) - timedelta(days=45)
+    db.add_all([
+        MonitoringPoint(
+            nome=f"antigo-{i}",
+            regiao="pantanal",
+            temperatura=30,
+            umidade=40,
+            nivel_fumaca=10,
+            velocidade_vento=5,
+            nivel_risco="alto",
+            estado="MS",
+            data_medicao=old + timedelta(hours=i),
+        )
+        for i in range(24)
+    ])
+    db.add_all([
+        Alert(titulo=f"alerta {i}", nivel_criticidade=level, regiao="cerrado", status=status)
+        for i, (level, status) in enumerate([("alto", "ativo"), ("critico", "ativo"), ("medio", "resolvido")])
+    ])
+    db.commit()
+    compact_readings(retention_days=30, prune=True)
+
+
+@pytest.mark.parametrize("url", list(EXPECTED_QUERIES))
+def test_summary_query_count(client, dashboard_data, url):
+    client.get(url)  # aquece a conexão (consultas de inicialização do dialeto)
+
+    with count_queries() as statements:
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert len(statements) == EXPECTED_QUERIES[url], statements
+
+
+@pytest.mark.parametrize("url", list(EXPECTED_QUERIES))
+def test_not_modified_costs_only_the_version_lookup(client, dashboard_data, url):
+    etag = client.get(url).headers["etag"]
+
+    with count_queries() as statements:
+        response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert len(statements) == 1, statements
+
+
+def test_dashboard_totals_include_compacted_readings(client, dashboard_data):
+    summary = client.get("/api/v1/dashboard/summary?dias=60").json()["monitoramento"]
+
+    assert summary["total_pontos"] == 40 + 20 + 24
+    assert summary["por_regiao"]["Pantanal"] == 24
+    assert sum(p["total"] for p in summary["por_periodo"]) == summary["total_pontos"]
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from app import metrics
+from app.routers import predictions
+
+from .conftest import add_points
+
+FLIGHT = "fire_risk_region"
+
+
+def _calls(role: str, flight: str = FLIGHT) -> float:
+    return metrics.SINGLEFLIGHT_CALLS.value(flight=flight, role=role)
+
+
+@pytest.mark.parametrize(
+    "url, loader, flight",
+    [
+        ("/api/v1/predictions/fire-risk/cerrado", "_load_region_fire_risk", FLIGHT),
+        ("/api/v1/predictions/fire-risk", "_load_fire_risk_overview", "fire_risk_overview"),
+    ],
+)
+def test_concurrent_requests_share_one_computation(app, db, monkeypatch, url, loader, flight):
+    add_points(db, "cerrado", 50)
+    followers = 7
+    leaders_before, coalesced_before = _calls("leader", flight), _calls("coalesced", flight)
+
+    # O cálculo do líder fica preso até todos os seguidores chegarem
+    started = threading.Event()
+    release = threading.Event()
+    load = getattr(predictions, loader)
+
+    def gated_load(*args):
+        started.set()
+        release.wait(timeout=10)
+        return load(*args)
+
+    monkeypatch.setattr(predictions, loader, gated_load)
+
+    async def wait_for(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            leader = asyncio.create_task(client.get(url))
+            # Seguidores só são disparados com o cálculo já em andamento: se ele
+            # bloqueasse o event loop, esta espera não terminaria antes dele
+            await wait_for(started.is_set)
+            others = [asyncio.create_task(client.get(url)) for _ in range(followers)]
+            await wait_for(lambda: _calls("coalesced", flight) - coalesced_before >= followers)
+            release.set()
+            return await asyncio.gather(leader, *others)
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * (followers + 1)
+    assert len({r.text for r in responses}) == 1
+    assert _calls("leader", flight) - leaders_before == 1
+    assert _calls("coalesced", flight) - coalesced_before == followers
+
+
+def test_region_requests_after_completion_run_again(client, db):
+    add_points(db, "pantanal", 10)
+    leaders_before = _calls("leader")
+
+    for _ in range(2):
+        response = client.get("/api/v1/predictions/fire-risk/pantanal")
+        assert response.status_code == 200
+        assert response.json()["pontos_analisados"] == 10
+
+    # Nada é guardado depois que a execução termina
+    assert _calls("leader") - leaders_before == 2
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import engine
+from app.models import versioning
+from app.models.monitoring import Alert
+
+
+def _alert():
+    return Alert(
+        titulo="alerta", descricao="teste", nivel_criticidade="alto", regiao="cerrado",
+        status="ativo", probabilidade=0.5,
+    )
+
+
+def _version(session) -> int:
+    return versioning.get_versions(session, ["alerts"])["alerts"][0]
+
+
+@pytest.fixture
+def single_connection_session(db):
+    # Um pool de uma conexão: o incremento não pode pedir outra enquanto a sessão segura a sua
+    small = create_engine(engine.url, pool_size=1, max_overflow=0, pool_timeout=1)
+    yield sessionmaker(bind=small)
+    small.dispose()
+
+
+def test_commit_bumps_version_without_a_second_connection(single_connection_session):
+    session = single_connection_session()
+    before = _version(session)
+    session.add(_alert())
+
+    started = time.perf_counter()
+    session.commit()
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.5
+    assert _version(session) == before + 1
+    assert not versioning.pending_tables(["alerts"])
+    session.close()
+
+
+def test_failed_bump_disables_not_modified_until_a_bump_succeeds(client, db, monkeypatch):
+    url = "/api/v1/alerts/"
+    etag = client.get(url).headers["etag"]
+
+    def failing_bump(connection, table_name):
+        raise RuntimeError("banco indisponível")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(versioning, "bump_version", failing_bump)
+        db.add(_alert())
+        db.commit()
+
+    assert versioning.pending_tables(["alerts"]) == {"alerts"}
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert len(response.json()) == 1
+
+    # O próximo incremento inclui a tabela pendente e o cache volta a valer
+    db.add(_alert())
+    db.commit()
+    assert not versioning.pending_tables(["alerts"])
+    fresh = client.get(url)
+    assert fresh.headers["etag"] != etag
+    assert client.get(url, headers={"If-None-Match": fresh.headers["etag"]}).status_code == 304